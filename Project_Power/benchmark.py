@@ -0,0 +1,165 @@
+import argparse
+import contextlib
+import io
+import time
+
+import numpy as np
+
+import socket_interface
+from socket_interface import (KEY_CANDIDATES, ConnectionPool, CpaAccumulator, KeyEnumerator, OnlineCpa,
+                              collect_traces_asyncio, collect_traces_parallel)
+from mock_server import MockPowerServer
+
+
+# --- Project Power Benchmark Suite ---
+# Measures socket_interface.py against a local MockPowerServer instead of a live HTB instance:
+#   1. collection throughput (traces/s) of every collector,
+#   2. CPA time per trace count,
+#   3. traces needed until the key is recovered (fixed-size CPA, key enumeration and online CPA).
+# Usage: python benchmark.py [--traces 2000] [--noise 1.0] [--latency 0.0] [--failure-rate 0.0]
+
+@contextlib.contextmanager
+def _quiet():
+    """
+    Silences the progress output of socket_interface while a measurement runs.
+    """
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+def _point_client_at(server):
+    socket_interface.HOST, socket_interface.PORT = server.server_address[:2]
+
+def _collect_without_keep_alive(n, workers):
+    with ConnectionPool(size=workers, prefetch=max(1, workers // 4), keep_alive=False) as pool:
+        return collect_traces_parallel(n=n, workers=workers, pool=pool)
+
+def bench_collection(server, n, workers=20, concurrency=200):
+    """
+    Measures the collection throughput of each collector against 'server'.
+
+    Returns:
+        list: (collector_name, traces_collected, seconds, traces_per_second) tuples.
+    """
+    _point_client_at(server)
+    collectors = [
+        ("threads + pool", lambda: collect_traces_parallel(n=n, workers=workers)),
+        ("threads, pool keep-alive off", lambda: _collect_without_keep_alive(n, workers)),
+        ("threads + pool, batches of 16", lambda: collect_traces_parallel(n=n, workers=workers, batch_size=16)),
+        ("asyncio", lambda: collect_traces_asyncio(n=n, concurrency=concurrency)),
+    ]
+    results = []
+    for name, collect in collectors:
+        start = time.perf_counter()
+        with _quiet():
+            pts, traces = collect()
+        elapsed = time.perf_counter() - start
+        results.append((name, len(traces), elapsed, len(traces) / elapsed if elapsed else float('inf')))
+    return results
+
+def bench_cpa(target, trace_counts, batch_size=1000):
+    """
+    Measures the single-pass CPA time for increasing numbers of locally generated traces.
+
+    Returns:
+        list: (trace_count, seconds, key_recovered) tuples.
+    """
+    rng = np.random.default_rng(0)
+    results = []
+    for n in trace_counts:
+        pts = rng.integers(0, 256, (n, 16), dtype=np.uint8)
+        traces = target.traces(pts)
+        start = time.perf_counter()
+        accumulator = CpaAccumulator(traces.shape[1])
+        for b0 in range(0, n, batch_size):
+            accumulator.update(pts[b0:b0 + batch_size], traces[b0:b0 + batch_size])
+        key = accumulator.best_key()
+        results.append((n, time.perf_counter() - start, key == target.key))
+    return results
+
+def bench_traces_to_key(target, max_traces=3000, step=100, stable_traces=300):
+    """
+    Finds how many traces the CPA needs to recover the key.
+
+    Returns:
+        dict: 'first_correct' (first trace count at which the fixed-size CPA is correct),
+              'stable_correct' (count from which it stays correct up to max_traces),
+              'first_enumerable' (first count at which the key's estimated rank is within
+                                  KEY_CANDIDATES, i.e. key enumeration would find it),
+              'online_stop' (count at which OnlineCpa declared convergence, or None) and
+              'online_correct' (whether the key at that point was right).
+    """
+    rng = np.random.default_rng(1)
+    pts = rng.integers(0, 256, (max_traces, 16), dtype=np.uint8)
+    traces = target.traces(pts)
+
+    accumulator = CpaAccumulator(traces.shape[1])
+    first_correct = stable_correct = first_enumerable = None
+    for b0 in range(0, max_traces, step):
+        accumulator.update(pts[b0:b0 + step], traces[b0:b0 + step])
+        correct = accumulator.best_key() == target.key
+        if first_enumerable is None:
+            _, rank, _ = KeyEnumerator(accumulator.scores(), accumulator.n).estimate_rank(target.key)
+            if rank <= KEY_CANDIDATES:
+                first_enumerable = accumulator.n
+        if correct and first_correct is None:
+            first_correct = accumulator.n
+        if correct and stable_correct is None:
+            stable_correct = accumulator.n
+        elif not correct:
+            stable_correct = None
+
+    online = OnlineCpa(stable_traces=stable_traces, update_every=step)
+    online_stop = None
+    with _quiet():
+        for i in range(max_traces):
+            online.add(pts[i].tobytes(), traces[i])
+            if online.converged:
+                online_stop = online.n
+                break
+    return {
+        'first_correct': first_correct,
+        'stable_correct': stable_correct,
+        'first_enumerable': first_enumerable,
+        'online_stop': online_stop,
+        'online_correct': online_stop is not None and online.best_key() == target.key,
+    }
+
+def run_benchmarks(traces=2000, noise=1.0, latency=0.0, failure_rate=0.0, keep_alive=False, samples=1042):
+    """
+    Runs all benchmarks against a fresh MockPowerServer and prints the results.
+    """
+    with MockPowerServer(noise=noise, latency=latency, failure_rate=failure_rate,
+                         keep_alive=keep_alive, samples=samples, seed=1337) as server:
+        print(f"[*] Mock server on {server.server_address[0]}:{server.server_address[1]} "
+              f"(noise {noise}, latency {latency * 1000:.1f} ms, failure rate {failure_rate:.1%}, "
+              f"keep-alive {'on' if keep_alive else 'off'}, {samples} samples/trace)")
+
+        print(f"\n--- Collection throughput ({traces} traces) ---")
+        for name, count, elapsed, rate in bench_collection(server, traces):
+            print(f"{name:<32} {count:>6} traces  {elapsed:8.2f} s  {rate:10.1f} traces/s")
+
+        print("\n--- CPA time per trace count ---")
+        for n, elapsed, ok in bench_cpa(server.target, [100, 500, 1000, 2000, 5000]):
+            print(f"{n:>6} traces  {elapsed:8.3f} s  {elapsed / n * 1e6:8.1f} us/trace  "
+                  f"key {'recovered' if ok else 'NOT recovered'}")
+
+        print("\n--- Traces to key recovery ---")
+        result = bench_traces_to_key(server.target)
+        print(f"First correct key at:        {result['first_correct']} traces")
+        print(f"Correct from then on at:     {result['stable_correct']} traces")
+        print(f"{f'Key rank <= {KEY_CANDIDATES} at:':<29}{result['first_enumerable']} traces")
+        print(f"Online CPA stopped at:       {result['online_stop']} traces "
+              f"(key {'correct' if result['online_correct'] else 'wrong'})")
+
+# --- Main Execution Block ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark socket_interface.py against a local mock server.")
+    parser.add_argument('--traces', type=int, default=2000, help="traces per collection benchmark")
+    parser.add_argument('--samples', type=int, default=1042, help="samples per trace")
+    parser.add_argument('--noise', type=float, default=1.0, help="Gaussian noise standard deviation")
+    parser.add_argument('--latency', type=float, default=0.0, help="server delay before every answer (s)")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="probability of a dropped request")
+    parser.add_argument('--keep-alive', action='store_true', help="server keeps connections open")
+    args = parser.parse_args()
+    run_benchmarks(traces=args.traces, noise=args.noise, latency=args.latency,
+                   failure_rate=args.failure_rate, keep_alive=args.keep_alive, samples=args.samples)
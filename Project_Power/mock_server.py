@@ -0,0 +1,244 @@
+import argparse
+import base64
+import random
+import socket
+import socketserver
+import threading
+import time
+
+import numpy as np
+
+from socket_interface import HW, HYPOTHESES
+
+
+# --- Local Stand-In for the Project Power Target ---
+# Speaks the same protocol as the remote lab, so socket_interface.py can be measured reproducibly
+# without a live instance:
+#   server -> banner/menu
+#   client -> option byte ('1' = trace, '2' = key submission), no newline
+#   server -> prompt
+#   client -> data (16 raw plaintext bytes for option 1, 32 hex characters for option 2)
+#   server -> base64-encoded float64 trace + newline (option 1), or a verdict line (option 2)
+# The traces leak the Hamming weight of the first-round AES S-box output of every key byte,
+# at a fixed sample per byte, on top of Gaussian noise.
+
+BANNER = b"=== Project Power remote lab ===\n1. Get power trace\n2. Submit key\n> "
+PROMPT = b"Data: "
+FLAG = b"HTB{m0ck_p0w3r_tr4c3s}"
+
+class MockPowerTarget:
+    """
+    Generates synthetic first-round AES power traces for a fixed key.
+    """
+    def __init__(self, key=None, samples=1042, noise=1.0, leak_offset=100, leak_spacing=50,
+                 amplitude=1.0, jitter=0, seed=None):
+        """
+        Args:
+            key (bytes): 16-byte AES key. Random if None.
+            samples (int): Number of samples per trace.
+            noise (float): Standard deviation of the Gaussian noise added to every sample.
+            leak_offset (int): Sample at which key byte 0 leaks.
+            leak_spacing (int): Distance in samples between the leaks of consecutive key bytes.
+            amplitude (float): Leakage per unit of Hamming weight.
+            jitter (int): Maximum random shift (in samples, either direction) applied to each trace.
+            seed (int): Seed for the key and noise generators.
+        """
+        self.rng = np.random.default_rng(seed)
+        self.key = key if key is not None else bytes(self.rng.integers(0, 256, 16, dtype=np.uint8))
+        if leak_offset + 15 * leak_spacing >= samples:
+            raise ValueError("Leakage positions do not fit into the trace length.")
+        self.samples = samples
+        self.noise = noise
+        self.leak_positions = leak_offset + leak_spacing * np.arange(16)
+        self.amplitude = amplitude
+        self.jitter = jitter
+        # A smooth, deterministic baseline so traces look like a power curve rather than pure noise.
+        self.baseline = 2.0 * np.sin(np.arange(samples) / 15.0)
+        self._key_array = np.frombuffer(self.key, dtype=np.uint8)
+        self._lock = threading.Lock() # numpy Generators are not thread-safe
+
+    def leakage(self, plaintexts):
+        """
+        Returns the noise-free leaking values HW[SBOX[pt[b] ^ key[b]]] for a (n, 16) plaintext matrix.
+        """
+        return HYPOTHESES[self._key_array, plaintexts].astype(np.float64)
+
+    def traces(self, plaintexts):
+        """
+        Generates one trace per plaintext.
+
+        Args:
+            plaintexts (numpy.ndarray): (n, 16) uint8 plaintext matrix.
+
+        Returns:
+            numpy.ndarray: (n, samples) float64 traces.
+        """
+        plaintexts = np.asarray(plaintexts, dtype=np.uint8).reshape(-1, 16)
+        n = len(plaintexts)
+        with self._lock:
+            noise = self.rng.normal(0.0, self.noise, (n, self.samples))
+            shifts = self.rng.integers(-self.jitter, self.jitter + 1, n) if self.jitter else None
+        out = self.baseline + noise
+        out[:, self.leak_positions] += self.amplitude * self.leakage(plaintexts)
+        if shifts is not None:
+            idx = np.clip(np.arange(self.samples)[None, :] - shifts[:, None], 0, self.samples - 1)
+            out = np.take_along_axis(out, idx, axis=1)
+        return out
+
+    def check_key(self, hex_key):
+        """
+        Returns True if 'hex_key' (bytes or str) is the hex encoding of the key.
+        """
+        if isinstance(hex_key, bytes):
+            hex_key = hex_key.decode('ascii', errors='ignore')
+        return hex_key.strip().lower() == self.key.hex()
+
+class _MockHandler(socketserver.BaseRequestHandler):
+    """
+    Serves one client connection of a MockPowerServer.
+    """
+    def _recv_exact(self, size):
+        data = b''
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                return None
+            data += chunk
+        return data
+
+    def handle(self):
+        server = self.server
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            sock.sendall(BANNER)
+            while True:
+                option = self._recv_exact(1)
+                if option is None:
+                    return
+                if option not in (b'1', b'2'):
+                    sock.sendall(b"Invalid option.\n")
+                    return
+                sock.sendall(PROMPT)
+                data = self._recv_exact(16 if option == b'1' else 32)
+                if data is None:
+                    return
+
+                if server.latency:
+                    time.sleep(server.latency)
+                if server.failure_rate and random.random() < server.failure_rate:
+                    server.count('failures')
+                    return # Simulated failure: hang up without an answer
+
+                if option == b'1':
+                    trace = server.target.traces(np.frombuffer(data, dtype=np.uint8))[0]
+                    if not server.newline:
+                        # Answer without the trailing newline and hang up: the close ends the payload
+                        sock.sendall(base64.b64encode(trace.tobytes()))
+                        server.count('traces')
+                        return
+                    sock.sendall(base64.b64encode(trace.tobytes()) + b"\n")
+                    server.count('traces')
+                else:
+                    if server.target.check_key(data):
+                        sock.sendall(b"Correct key! " + FLAG + b"\n")
+                    else:
+                        sock.sendall(b"Wrong key.\n")
+                    server.count('keys')
+
+                if not server.keep_alive:
+                    return
+                sock.sendall(BANNER)
+        except OSError:
+            return
+
+class MockPowerServer(socketserver.ThreadingTCPServer):
+    """
+    Threaded TCP server emulating the Project Power target, for tests and benchmarks.
+
+    Usage:
+        with MockPowerServer(noise=1.0) as server:
+            socket_interface.HOST, socket_interface.PORT = server.server_address
+            ...
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+    request_queue_size = 1024
+
+    def __init__(self, host='127.0.0.1', port=0, target=None, latency=0.0, failure_rate=0.0,
+                 keep_alive=False, newline=True, **target_kwargs):
+        """
+        Args:
+            host (str): Address to listen on.
+            port (int): Port to listen on; 0 picks a free port (see server_address).
+            target (MockPowerTarget): Trace generator. Created from target_kwargs if None.
+            latency (float): Delay in seconds before every answer.
+            failure_rate (float): Probability of hanging up instead of answering a request.
+            keep_alive (bool): Return to the menu after an answer instead of closing the connection.
+            newline (bool): Terminate traces with a newline. If False, a trace is sent without it
+                            and the connection is closed right after (overrides keep_alive).
+            **target_kwargs: Passed to MockPowerTarget (key, samples, noise, jitter, seed, ...).
+        """
+        self.target = target if target is not None else MockPowerTarget(**target_kwargs)
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.keep_alive = keep_alive
+        self.newline = newline
+        self.counters = {'traces': 0, 'keys': 0, 'failures': 0}
+        self._counter_lock = threading.Lock()
+        self._thread = None
+        super().__init__((host, port), _MockHandler)
+
+    def count(self, name):
+        with self._counter_lock:
+            self.counters[name] += 1
+
+    def start(self):
+        """
+        Serves in a background thread and returns immediately.
+        """
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stops serving and closes the listening socket.
+        """
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+# --- Main Execution Block ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Project Power trace server.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=1337)
+    parser.add_argument('--samples', type=int, default=1042, help="samples per trace")
+    parser.add_argument('--noise', type=float, default=1.0, help="Gaussian noise standard deviation")
+    parser.add_argument('--jitter', type=int, default=0, help="maximum random trace shift in samples")
+    parser.add_argument('--latency', type=float, default=0.0, help="delay before every answer (s)")
+    parser.add_argument('--failure-rate', type=float, default=0.0, help="probability of dropping a request")
+    parser.add_argument('--keep-alive', action='store_true', help="serve several requests per connection")
+    parser.add_argument('--no-newline', action='store_true',
+                        help="send traces without a trailing newline and close the connection")
+    parser.add_argument('--key', help="AES key as 32 hex characters (random if omitted)")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    server = MockPowerServer(args.host, args.port, latency=args.latency, failure_rate=args.failure_rate,
+                             keep_alive=args.keep_alive, newline=not args.no_newline,
+                             key=bytes.fromhex(args.key) if args.key else None,
+                             samples=args.samples, noise=args.noise, jitter=args.jitter, seed=args.seed)
+    print(f"[*] Mock Project Power server on {args.host}:{args.port} (key {server.target.key.hex()})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
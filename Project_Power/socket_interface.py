@@ -1,12 +1,20 @@
 import numpy as np
+import asyncio
 import socket
 import base64
+import bisect
+import binascii
+import csv
+import heapq
+import json
+import os
 import random
+import re
 import time
-from concurrent.futures import ThreadPoolExecutor, as_completed
-from lascar.container import AcquisitionFromGetters 
-from lascar import CpaEngine, Session
-from lascar.tools.aes import sbox
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
 
 
 # --- Network Configuration ---
@@ -22,40 +30,917 @@ PORT = 1337
 # Converted to a NumPy array with dtype=np.uint8 for Numba compatibility and efficiency.
 HW = np.array([bin(n).count("1") for n in range(256)], dtype=np.uint8)
 
+# AES S-box (FIPS-197). Kept here so the NumPy CPA engines and the power model do not need lascar,
+# which is only imported by the lascar-based functions that use it.
+SBOX = np.array([
+    0x63, 0x7c, 0x77, 0x7b, 0xf2, 0x6b, 0x6f, 0xc5, 0x30, 0x01, 0x67, 0x2b, 0xfe, 0xd7, 0xab, 0x76,
+    0xca, 0x82, 0xc9, 0x7d, 0xfa, 0x59, 0x47, 0xf0, 0xad, 0xd4, 0xa2, 0xaf, 0x9c, 0xa4, 0x72, 0xc0,
+    0xb7, 0xfd, 0x93, 0x26, 0x36, 0x3f, 0xf7, 0xcc, 0x34, 0xa5, 0xe5, 0xf1, 0x71, 0xd8, 0x31, 0x15,
+    0x04, 0xc7, 0x23, 0xc3, 0x18, 0x96, 0x05, 0x9a, 0x07, 0x12, 0x80, 0xe2, 0xeb, 0x27, 0xb2, 0x75,
+    0x09, 0x83, 0x2c, 0x1a, 0x1b, 0x6e, 0x5a, 0xa0, 0x52, 0x3b, 0xd6, 0xb3, 0x29, 0xe3, 0x2f, 0x84,
+    0x53, 0xd1, 0x00, 0xed, 0x20, 0xfc, 0xb1, 0x5b, 0x6a, 0xcb, 0xbe, 0x39, 0x4a, 0x4c, 0x58, 0xcf,
+    0xd0, 0xef, 0xaa, 0xfb, 0x43, 0x4d, 0x33, 0x85, 0x45, 0xf9, 0x02, 0x7f, 0x50, 0x3c, 0x9f, 0xa8,
+    0x51, 0xa3, 0x40, 0x8f, 0x92, 0x9d, 0x38, 0xf5, 0xbc, 0xb6, 0xda, 0x21, 0x10, 0xff, 0xf3, 0xd2,
+    0xcd, 0x0c, 0x13, 0xec, 0x5f, 0x97, 0x44, 0x17, 0xc4, 0xa7, 0x7e, 0x3d, 0x64, 0x5d, 0x19, 0x73,
+    0x60, 0x81, 0x4f, 0xdc, 0x22, 0x2a, 0x90, 0x88, 0x46, 0xee, 0xb8, 0x14, 0xde, 0x5e, 0x0b, 0xdb,
+    0xe0, 0x32, 0x3a, 0x0a, 0x49, 0x06, 0x24, 0x5c, 0xc2, 0xd3, 0xac, 0x62, 0x91, 0x95, 0xe4, 0x79,
+    0xe7, 0xc8, 0x37, 0x6d, 0x8d, 0xd5, 0x4e, 0xa9, 0x6c, 0x56, 0xf4, 0xea, 0x65, 0x7a, 0xae, 0x08,
+    0xba, 0x78, 0x25, 0x2e, 0x1c, 0xa6, 0xb4, 0xc6, 0xe8, 0xdd, 0x74, 0x1f, 0x4b, 0xbd, 0x8b, 0x8a,
+    0x70, 0x3e, 0xb5, 0x66, 0x48, 0x03, 0xf6, 0x0e, 0x61, 0x35, 0x57, 0xb9, 0x86, 0xc1, 0x1d, 0x9e,
+    0xe1, 0xf8, 0x98, 0x11, 0x69, 0xd9, 0x8e, 0x94, 0x9b, 0x1e, 0x87, 0xe9, 0xce, 0x55, 0x28, 0xdf,
+    0x8c, 0xa1, 0x89, 0x0d, 0xbf, 0xe6, 0x42, 0x68, 0x41, 0x99, 0x2d, 0x0f, 0xb0, 0x54, 0xbb, 0x16,
+], dtype=np.uint8)
+
+# Sample type of the traces sent by the server: raw float64 values, base64-encoded.
+TRACE_DTYPE = np.dtype(np.float64)
+
 # --- Base64 Decoding Function ---
-def b64_decode_trace(leakage):
+def b64_decode_trace(leakage, dtype=TRACE_DTYPE, num_samples=None):
     """
     Decodes a base64-encoded byte string into a NumPy array representing a power trace.
     
     Args:
         leakage (bytes): The base64-encoded power trace received from the server.
+        dtype: Sample type of the encoded trace.
+        num_samples (int): Expected number of samples, or None to accept any non-empty trace.
         
     Returns:
         numpy.ndarray: The decoded power trace as a NumPy array.
         
     Raises:
         ValueError: If base64 decoding fails, NumPy conversion fails,
-                    or the resulting power trace is empty.
+                    or the resulting power trace is empty or of the wrong length.
     """
     try:
         # Decode the base64 string to raw byte data
         byte_data = base64.b64decode(leakage)
         # Convert the raw byte data into a NumPy array of numerical values
-        trace_array = np.frombuffer(byte_data)
+        trace_array = np.frombuffer(byte_data, dtype=dtype)
         
         # Critical check: Ensure the decoded trace is not empty.
         # An empty trace can cause 'ValueError: could not broadcast input array from shape (0,)'
         # errors later in lascar's processing.
         if trace_array.size == 0:
             raise ValueError("Decoded power trace is empty.")
+        if num_samples is not None and trace_array.size != num_samples:
+            raise ValueError(f"Decoded power trace has {trace_array.size} samples, expected {num_samples}.")
             
         return trace_array
     except Exception as e:
         # Catch any exceptions during decoding/conversion and re-raise as ValueError
         raise ValueError(f"Base64 decode or numpy conversion failed: {e}")
 
+def b64_decode_traces(responses, num_samples=None, dtype=TRACE_DTYPE, out=None):
+    """
+    Decodes a batch of base64-encoded traces straight into the rows of one trace matrix.
+    
+    Each response is decoded once and copied into its row through a zero-copy view of the
+    decoded bytes: no per-trace array is allocated, and the result needs no stacking later.
+    
+    Args:
+        responses (list): Base64-encoded traces (bytes). None entries (unanswered requests) are skipped.
+        num_samples (int): Expected number of samples per trace. Taken from the first decodable
+                           response if None (and from 'out' if given).
+        dtype: Sample type of the encoded traces.
+        out (numpy.ndarray): Optional preallocated (len(responses), num_samples) matrix to decode into.
+        
+    Returns:
+        tuple: (traces, valid) - the trace matrix and a boolean mask of the rows that were decoded.
+               Rows whose response was missing, not valid base64 or of the wrong length are
+               left untouched and marked False.
+    """
+    dtype = np.dtype(dtype)
+    valid = np.zeros(len(responses), dtype=bool)
+    if out is not None:
+        num_samples = out.shape[1]
+    row_bytes = None if num_samples is None else num_samples * dtype.itemsize
+
+    for row, raw in enumerate(responses):
+        if raw is None:
+            continue
+        try:
+            byte_data = binascii.a2b_base64(raw)
+        except (binascii.Error, ValueError):
+            continue
+        if row_bytes is None:
+            # First decodable response fixes the row length for the whole batch.
+            if not byte_data or len(byte_data) % dtype.itemsize:
+                continue
+            row_bytes = len(byte_data)
+            num_samples = row_bytes // dtype.itemsize
+        if len(byte_data) != row_bytes:
+            continue
+        if out is None:
+            out = np.empty((len(responses), num_samples), dtype=dtype)
+        out[row] = np.frombuffer(byte_data, dtype=dtype)
+        valid[row] = True
+
+    if out is None:
+        out = np.empty((len(responses), num_samples or 0), dtype=dtype)
+    return out, valid
+
+# --- Framed Response Reader ---
+# A trace (option 1) is a single base64 line, so the newline after it marks the end of the
+# response and the request can finish without waiting for the server to close the socket.
+# The key submission reply (option 2) may span several lines (e.g. a message and the flag),
+# so it is read until the server closes or goes quiet. Options missing here are read the same way.
+RESPONSE_DELIMITERS = {
+    b'1': b'\n',
+    b'2': None,
+}
+
+class ResponseReader:
+    """
+    Reads one server response into a preallocated, reusable buffer with recv_into.
+    
+    The buffer is only grown (doubled) when a response does not fit, so steady-state
+    reads do no per-chunk allocation or concatenation.
+    """
+    def __init__(self, initial_size=64 * 1024):
+        self._buf = bytearray(initial_size)
+        self.trailing = b'' # Non-whitespace bytes received after the delimiter of the last response
+
+    def read(self, sock, delimiter=b'\n', idle_timeout=None):
+        """
+        Receives a response from 'sock'.
+        
+        Leading whitespace (e.g. the end of a prompt line) is skipped, and the response ends at
+        the first 'delimiter' after it, when the peer closes the connection, or on timeout.
+        
+        Args:
+            sock (socket.socket): Connected socket with the request already sent.
+            delimiter (bytes): Byte sequence terminating the response, or None to read until
+                               the peer closes (or times out).
+            idle_timeout (float): If set, the socket timeout used once response data has started,
+                                  so a response without delimiter on a kept-open session ends
+                                  after this much silence instead of the full socket timeout.
+                                  
+        Returns:
+            tuple: (payload, end). payload is the response without leading/trailing whitespace
+                   and delimiter (bytes), or None if nothing was received. end is 'delimiter',
+                   'close' or 'timeout'.
+        """
+        buf = self._buf
+        received = 0
+        payload_start = 0 # First non-whitespace byte of the response
+        scan_from = 0 # Where the next delimiter search starts
+        end = None
+        delimiter_idx = -1
+        original_timeout = sock.gettimeout()
+        try:
+            while end is None:
+                if received == len(buf):
+                    buf.extend(bytes(len(buf))) # Out of room: double the buffer
+                with memoryview(buf) as view:
+                    n = sock.recv_into(view[received:])
+                if n == 0:
+                    end = 'close'
+                    break
+                received += n
+                while payload_start < received and buf[payload_start] in b' \t\r\n':
+                    payload_start += 1
+                if delimiter is not None and payload_start < received:
+                    delimiter_idx = buf.find(delimiter, max(scan_from, payload_start), received)
+                    if delimiter_idx != -1:
+                        end = 'delimiter'
+                        break
+                    # A delimiter split across two reads must still be found next time.
+                    scan_from = max(payload_start, received - len(delimiter) + 1)
+                if idle_timeout is not None and payload_start < received:
+                    sock.settimeout(idle_timeout)
+        except socket.timeout:
+            end = 'timeout'
+        finally:
+            sock.settimeout(original_timeout)
+
+        # On a kept-open session the server's next menu may arrive in the same read as the response.
+        self.trailing = bytes(buf[delimiter_idx + len(delimiter):received]).strip() if end == 'delimiter' else b''
+        if payload_start >= received:
+            return None, end
+        stop = delimiter_idx if end == 'delimiter' else received
+        return bytes(buf[payload_start:stop]).rstrip(), end
+
+    def read_payload_lines(self, sock, count, is_payload):
+        """
+        Receives lines until 'count' of them carry a payload (see is_payload), e.g. the answers
+        to several pipelined requests. Menu and prompt text around the payloads is skipped.
+        
+        Args:
+            sock (socket.socket): Connected socket with the requests already sent.
+            count (int): Number of payloads expected.
+            is_payload (callable): Returns True if a line's last whitespace-separated token
+                                   is a payload (prompts may precede it on the same line).
+                                   
+        Returns:
+            tuple: (payloads, end). payloads is the list of payload tokens found (bytes, in
+                   order). end is 'complete', 'close' or 'timeout'.
+        """
+        buf = self._buf
+        received = 0
+        line_start = 0 # Start of the first line not yet examined
+        payloads = []
+        end = None
+        try:
+            while True:
+                if received == len(buf):
+                    if line_start > 0: # Drop the examined lines before growing the buffer
+                        buf[:received - line_start] = buf[line_start:received]
+                        received -= line_start
+                        line_start = 0
+                    else:
+                        buf.extend(bytes(len(buf)))
+                with memoryview(buf) as view:
+                    n = sock.recv_into(view[received:])
+                if n == 0:
+                    end = 'close'
+                    break
+                received += n
+                newline = buf.find(b'\n', line_start, received)
+                while newline != -1 and len(payloads) < count:
+                    tokens = bytes(buf[line_start:newline]).split()
+                    if tokens and is_payload(tokens[-1]):
+                        payloads.append(tokens[-1])
+                    line_start = newline + 1
+                    newline = buf.find(b'\n', line_start, received)
+                if len(payloads) == count:
+                    end = 'complete'
+                    break
+        except socket.timeout:
+            end = 'timeout'
+        self.trailing = bytes(buf[line_start:received]).strip() if end == 'complete' else b''
+        return payloads, end
+
+_reader_local = threading.local()
+
+def _thread_response_reader():
+    """
+    Returns the calling thread's ResponseReader, so every worker reuses one buffer.
+    """
+    reader = getattr(_reader_local, 'reader', None)
+    if reader is None:
+        reader = _reader_local.reader = ResponseReader()
+    return reader
+
+# A trace answer is one long base64 token (optionally preceded by a prompt on the same line);
+# menu lines end in short words, so a minimum length separates the two when answers are pipelined.
+_TRACE_PAYLOAD_RE = re.compile(rb'[A-Za-z0-9+/]{40,}={0,2}')
+
+def _is_trace_payload(token):
+    return len(token) % 4 == 0 and _TRACE_PAYLOAD_RE.fullmatch(token) is not None
+
+# --- Acquisition Telemetry ---
+# A collection run at thousands of requests per second cannot be profiled with prints. The
+# telemetry object is handed to the pool and the collectors, which time each phase (connect,
+# request, decode, retry sleep, whole trace) into log-scale histograms, count retries, timeouts
+# and errors, and sample the number of requests in flight. Recording is a bisect and a few
+# additions under one lock: about a microsecond per call, against milliseconds per request.
+
+class AcquisitionTelemetry:
+    """
+    Thread-safe latency histograms, counters and in-flight gauge of one acquisition run.
+    
+    Phases and counters are created on first use, so new instrumentation points need no
+    registration. Latencies go into log-scale buckets (ten per decade, 10 us to 100 s).
+    """
+    BUCKET_BOUNDS = [10.0 ** (e / 10) for e in range(-50, 21)] # Upper bounds in seconds
+
+    def __init__(self, progress_callback=None, progress_interval=1.0, sample_interval=0.1):
+        """
+        Args:
+            progress_callback (callable): Called with a snapshot() dict at most every
+                                          'progress_interval' seconds while traces are collected.
+            progress_interval (float): Minimum time between two progress callbacks.
+            sample_interval (float): Minimum time between two samples of the in-flight gauge.
+        """
+        self.progress_callback = progress_callback
+        self.progress_interval = progress_interval
+        self.sample_interval = sample_interval
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+        self.histograms = {} # phase -> bucket counts (one more than BUCKET_BOUNDS, for overflow)
+        self.totals = {} # phase -> [count, sum, max]
+        self.counters = {}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.concurrency = [] # (elapsed seconds, requests in flight) samples
+        self.collected = 0
+        self.target = None
+        self._last_sample = float('-inf')
+        self._last_progress = float('-inf')
+        self._lock = threading.Lock()
+
+    def start(self):
+        """
+        Marks the start of the run (called by the collectors; elapsed times count from here).
+        """
+        self.started_at = time.perf_counter()
+        self.finished_at = None
+
+    def record(self, phase, seconds):
+        """
+        Adds one latency measurement (in seconds) to the histogram of 'phase'.
+        """
+        bucket = bisect.bisect_left(self.BUCKET_BOUNDS, seconds)
+        with self._lock:
+            histogram = self.histograms.get(phase)
+            if histogram is None:
+                histogram = self.histograms[phase] = [0] * (len(self.BUCKET_BOUNDS) + 1)
+                self.totals[phase] = [0, 0.0, 0.0]
+            histogram[bucket] += 1
+            totals = self.totals[phase]
+            totals[0] += 1
+            totals[1] += seconds
+            if seconds > totals[2]:
+                totals[2] = seconds
+
+    def count(self, name, amount=1):
+        """
+        Increments the counter 'name' (e.g. 'retries', 'timeouts', 'decode_errors').
+        """
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def _sample(self, now):
+        if now - self._last_sample >= self.sample_interval:
+            self._last_sample = now
+            self.concurrency.append((now - self.started_at, self.in_flight))
+
+    def request_started(self, amount=1):
+        """
+        Marks 'amount' requests as in flight.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            self.in_flight += amount
+            if self.in_flight > self.max_in_flight:
+                self.max_in_flight = self.in_flight
+            self._sample(now)
+
+    def request_finished(self, amount=1):
+        """
+        Marks 'amount' in-flight requests as finished.
+        """
+        now = time.perf_counter()
+        with self._lock:
+            self.in_flight -= amount
+            self._sample(now)
+
+    def progress(self, collected, target):
+        """
+        Updates the collection progress and calls the progress callback if it is due.
+        """
+        self.collected, self.target = collected, target
+        if self.progress_callback is None:
+            return
+        now = time.perf_counter()
+        if now - self._last_progress >= self.progress_interval or collected >= target:
+            self._last_progress = now
+            self.progress_callback(self.snapshot())
+
+    def finish(self):
+        """
+        Marks the end of the run (the elapsed time of later snapshots stops here).
+        """
+        self.finished_at = time.perf_counter()
+        with self._lock:
+            self._last_sample = float('-inf')
+            self._sample(self.finished_at)
+
+    def _percentile(self, histogram, total, peak, q):
+        rank = q * total
+        cumulative = 0
+        for bucket, count in enumerate(histogram):
+            cumulative += count
+            if cumulative >= rank:
+                break
+        bound = self.BUCKET_BOUNDS[bucket] if bucket < len(self.BUCKET_BOUNDS) else peak
+        return min(bound, peak)
+
+    def snapshot(self):
+        """
+        Returns the current state as a dictionary:
+            'elapsed', 'collected', 'target', 'rate' (traces/s), 'in_flight', 'max_in_flight',
+            'counters' and 'phases' ({phase: {'count', 'mean', 'p50', 'p90', 'p99', 'max'}}).
+        Percentiles are the upper bounds of the histogram buckets they fall into (at most the maximum).
+        """
+        end = self.finished_at if self.finished_at is not None else time.perf_counter()
+        elapsed = end - self.started_at
+        with self._lock:
+            phases = {}
+            for phase, (count, total, peak) in self.totals.items():
+                histogram = self.histograms[phase]
+                phases[phase] = {
+                    'count': count,
+                    'mean': total / count,
+                    'p50': self._percentile(histogram, count, peak, 0.5),
+                    'p90': self._percentile(histogram, count, peak, 0.9),
+                    'p99': self._percentile(histogram, count, peak, 0.99),
+                    'max': peak,
+                }
+            return {
+                'elapsed': elapsed,
+                'collected': self.collected,
+                'target': self.target,
+                'rate': self.collected / elapsed if elapsed > 0 else 0.0,
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight,
+                'counters': dict(self.counters),
+                'phases': phases,
+            }
+
+    def to_dict(self):
+        """
+        Returns the snapshot plus the raw histograms and the in-flight samples (JSON-serialisable).
+        """
+        data = self.snapshot()
+        with self._lock:
+            data['bucket_bounds'] = list(self.BUCKET_BOUNDS)
+            data['histograms'] = {phase: list(h) for phase, h in self.histograms.items()}
+            data['concurrency'] = list(self.concurrency)
+        return data
+
+    def export_json(self, path):
+        """
+        Writes to_dict() to 'path' as JSON.
+        """
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    def export_csv(self, path):
+        """
+        Writes the telemetry to 'path' as CSV in long format, with columns section, name, field, value:
+            phase        phase name   count/mean/p50/p90/p99/max   value (seconds)
+            histogram    phase name   le_<bucket bound>            count (non-empty buckets only)
+            counter      counter name                              value
+            concurrency                 <elapsed seconds>          requests in flight
+        """
+        data = self.to_dict()
+        bounds = data['bucket_bounds'] + [float('inf')]
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['section', 'name', 'field', 'value'])
+            for phase, stats in data['phases'].items():
+                for field, value in stats.items():
+                    writer.writerow(['phase', phase, field, value])
+            for phase, histogram in data['histograms'].items():
+                for bound, count in zip(bounds, histogram):
+                    if count:
+                        writer.writerow(['histogram', phase, f"le_{bound:.6g}", count])
+            for name, value in data['counters'].items():
+                writer.writerow(['counter', name, '', value])
+            for elapsed, in_flight in data['concurrency']:
+                writer.writerow(['concurrency', '', f"{elapsed:.3f}", in_flight])
+
+    def print_summary(self):
+        """
+        Prints the per-phase latencies and the counters.
+        """
+        snap = self.snapshot()
+        print(f"[*] Telemetry: {snap['collected']} traces in {snap['elapsed']:.2f} s "
+              f"({snap['rate']:.1f} traces/s), max {snap['max_in_flight']} requests in flight.")
+        for phase, st in snap['phases'].items():
+            print(f"    {phase:<12} n={st['count']:<7} mean {st['mean'] * 1000:8.2f} ms  "
+                  f"p50 {st['p50'] * 1000:8.2f} ms  p99 {st['p99'] * 1000:8.2f} ms  max {st['max'] * 1000:8.2f} ms")
+        if snap['counters']:
+            print("    counters: " + ", ".join(f"{k}={v}" for k, v in sorted(snap['counters'].items())))
+
+# --- Connection Pool ---
+# Every request used to pay for its own TCP connect and banner read, which dominates
+# collection time at thousands of traces. The pool below keeps sessions open and reuses
+# them for further requests whenever the server returns to its menu instead of hanging up.
+# When the server closes after every request, background threads keep a few connections
+# connected (banner already consumed) ahead of demand, so collectors never wait on the
+# handshake themselves.
+
+class ConnectionStats:
+    """
+    Per-connection statistics recorded by the ConnectionPool.
+    """
+    def __init__(self, conn_id):
+        self.conn_id = conn_id
+        self.handshake_latency = None # Seconds spent in connect + banner read
+        self.requests = 0 # Requests served over this connection
+        self.reuse_count = 0 # Requests served after the first one (keep-alive reuse)
+        self.failures = 0 # Requests that failed on this connection
+        self.created_at = time.time()
+        self.closed_at = None
+
+    def as_dict(self):
+        """
+        Returns the statistics as a plain dictionary (e.g., for logging or JSON export).
+        """
+        return {
+            'conn_id': self.conn_id,
+            'handshake_latency': self.handshake_latency,
+            'requests': self.requests,
+            'reuse_count': self.reuse_count,
+            'failures': self.failures,
+            'created_at': self.created_at,
+            'closed_at': self.closed_at,
+        }
+
+class PooledConnection:
+    """
+    A connected socket whose banner has already been consumed, plus its statistics.
+    """
+    def __init__(self, sock, stats):
+        self.sock = sock
+        self.stats = stats
+        self.timeout = sock.gettimeout()
+        self.menu_pending = False # True if the menu the server re-sends after a response is still unread
+        self.ready_since = time.time() # When the connection last became ready for a request
+        self.waited = False # True if the connection sat in the pool before being handed out
+
+    def close(self):
+        """
+        Closes the underlying socket and records the closing time.
+        """
+        if self.stats.closed_at is None:
+            self.stats.closed_at = time.time()
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def is_open(self):
+        """
+        Checks without blocking or consuming data whether the peer is still connected.
+        
+        Returns:
+            bool: False if the peer has closed the connection, True otherwise.
+        """
+        self.sock.setblocking(False)
+        try:
+            return bool(self.sock.recv(1, socket.MSG_PEEK)) # b'' means the peer closed
+        except (BlockingIOError, InterruptedError):
+            return True # Nothing buffered, but still connected
+        except OSError:
+            return False
+        finally:
+            self.sock.settimeout(self.timeout)
+
+class ConnectionPool:
+    """
+    Keeps sessions to the target server open and hands them out to request callers.
+    
+    Connections are reused for further requests while the server keeps them open
+    (keep-alive). Independently of that, `prefetch` connections are established and
+    have their banner read in the background, so a fresh session is ready whenever
+    the server closes one after a request.
+    """
+    def __init__(self, host=None, port=None, size=20, prefetch=4, prefetch_workers=2,
+                 timeout=5.0, idle_timeout=0.5, max_idle=10.0, keep_alive=True, telemetry=None):
+        """
+        Args:
+            host (str): Target host. Defaults to the module-level HOST.
+            port (int): Target port. Defaults to the module-level PORT.
+            size (int): Maximum number of idle keep-alive connections retained.
+            prefetch (int): Number of handshaken connections kept ready ahead of demand.
+            prefetch_workers (int): Background threads establishing prefetched connections.
+            timeout (float): Socket timeout for connect, send and the first response bytes.
+            idle_timeout (float): Silence (in seconds) after response data has started that
+                                  marks the end of an unframed response (see RESPONSE_DELIMITERS)
+                                  on a session the server keeps open.
+            max_idle (float): Ready connections older than this are discarded instead of used,
+                              since the server may have dropped them in the meantime.
+            keep_alive (bool): Whether to attempt reusing connections after a response.
+            telemetry (AcquisitionTelemetry): Optional telemetry receiving the 'connect' and
+                                              'request' latencies and connection error counters.
+        """
+        self.host = host if host is not None else HOST
+        self.port = port if port is not None else PORT
+        self.size = size
+        self.prefetch = prefetch
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.max_idle = max_idle
+        self.keep_alive = keep_alive
+        self.telemetry = telemetry
+
+        self._idle = queue.LifoQueue() # Reusable sessions (most recently used first)
+        self._warm = queue.Queue() # Prefetched, never-used sessions
+        self._lock = threading.Lock()
+        self._next_conn_id = 0
+        self._all_stats = [] # ConnectionStats of every connection ever opened
+        self._handshake_failures = 0
+        self._reuse_successes = 0 # Requests that succeeded on a reused session
+        self._reuse_failures = 0 # Reused sessions the server had closed after all
+        self._closed = threading.Event()
+        self._demand = threading.Event() # Set whenever a prefetched connection is taken
+
+        self._prefetchers = []
+        if prefetch > 0:
+            for _ in range(prefetch_workers):
+                t = threading.Thread(target=self._prefetch_loop, daemon=True)
+                t.start()
+                self._prefetchers.append(t)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _handshake(self):
+        """
+        Opens a new connection and consumes the server banner.
+        
+        Returns:
+            PooledConnection: The ready connection.
+            
+        Raises:
+            OSError: If connecting or reading the banner fails.
+        """
+        with self._lock:
+            conn_id = self._next_conn_id
+            self._next_conn_id += 1
+        start = time.perf_counter()
+        s = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        try:
+            s.settimeout(self.timeout)
+            s.connect((self.host, self.port))
+            # Small request/response exchanges: disable Nagle so option and data go out immediately.
+            s.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            if not s.recv(1024): # Banner; content is ignored as in interact_with_server
+                raise ConnectionError("Server closed the connection before sending the banner.")
+        except OSError as e:
+            s.close()
+            with self._lock:
+                self._handshake_failures += 1
+            if self.telemetry is not None:
+                self.telemetry.count('connect_timeouts' if isinstance(e, socket.timeout) else 'connect_failures')
+            raise
+        stats = ConnectionStats(conn_id)
+        stats.handshake_latency = time.perf_counter() - start
+        if self.telemetry is not None:
+            self.telemetry.record('connect', stats.handshake_latency)
+        with self._lock:
+            self._all_stats.append(stats)
+        return PooledConnection(s, stats)
+
+    def _prefetch_loop(self):
+        """
+        Background loop keeping `prefetch` handshaken connections ready.
+        """
+        while not self._closed.is_set():
+            if self._warm.qsize() >= self.prefetch:
+                # Enough ready connections; wait until one is taken (or periodically re-check).
+                self._demand.wait(0.05)
+                self._demand.clear()
+                continue
+            try:
+                conn = self._handshake()
+            except OSError:
+                # Server unreachable or refusing: back off briefly instead of spinning.
+                self._closed.wait(0.1)
+                continue
+            if self._closed.is_set():
+                conn.close()
+                break
+            self._warm.put(conn)
+
+    def _take_ready(self, q):
+        """
+        Pops the first usable connection from a queue, discarding stale or closed ones.
+        """
+        while True:
+            try:
+                conn = q.get_nowait()
+            except queue.Empty:
+                return None
+            if time.time() - conn.ready_since > self.max_idle or not conn.is_open():
+                conn.close()
+                continue
+            conn.waited = True
+            return conn
+
+    def acquire(self):
+        """
+        Returns a ready connection: a reusable keep-alive session if available, otherwise
+        a prefetched one, otherwise a freshly established one.
+        
+        Raises:
+            OSError: If a new connection has to be established and that fails.
+        """
+        conn = self._take_ready(self._idle)
+        if conn is None:
+            conn = self._take_ready(self._warm)
+            if conn is not None:
+                self._demand.set() # Ask the prefetchers to replace it
+        if conn is None:
+            conn = self._handshake()
+        return conn
+
+    def _keep_alive_enabled(self):
+        """
+        Keep-alive is attempted until the server has shown it does not support it:
+        several reused sessions failed and none ever succeeded.
+        """
+        return self.keep_alive and (self._reuse_successes > 0 or self._reuse_failures < 3)
+
+    def release(self, conn, reusable):
+        """
+        Returns a connection to the pool after a request.
+        
+        Args:
+            conn (PooledConnection): The connection used for the request.
+            reusable (bool): Whether the server left the session open and in a usable state.
+        """
+        if (reusable and self._keep_alive_enabled() and not self._closed.is_set()
+                and self._idle.qsize() < self.size):
+            conn.ready_since = time.time()
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def request(self, option: bytes, data: bytes) -> bytes:
+        """
+        Performs one option/data exchange over a pooled connection.
+        
+        If a reused or prefetched connection turns out to have been dropped by the server
+        before any response arrived, the request is retried once on a new connection.
+        
+        Args:
+            option (bytes): The server option ('1' or '2').
+            data (bytes): The data for the option (plaintext or hex-encoded key).
+            
+        Returns:
+            bytes: The raw response, or None if the exchange failed.
+        """
+        for attempt in range(2):
+            try:
+                conn = self.acquire()
+            except OSError:
+                return None
+            fresh = conn.stats.requests == 0
+            conn.stats.requests += 1
+            if not fresh:
+                conn.stats.reuse_count += 1
+            start = time.perf_counter()
+            try:
+                s = conn.sock
+                if conn.menu_pending:
+                    # The server re-sends its menu after a response on a kept-open session;
+                    # consume it just like the banner of a fresh connection.
+                    s.recv(1024)
+                    conn.menu_pending = False
+                s.sendall(option)
+                s.recv(1024) # Prompt after the option; content is ignored
+                s.sendall(data)
+                # A framed response is read up to its delimiter with the full socket timeout.
+                # The server closing the connection also ends the payload; only running into the
+                # timeout while a delimiter is still expected means the answer was truncated.
+                # Unframed responses end when the server goes quiet, which leaves it at its menu.
+                reader = _thread_response_reader()
+                delimiter = RESPONSE_DELIMITERS.get(option)
+                resp_data, end = reader.read(
+                    s, delimiter=delimiter,
+                    idle_timeout=self.idle_timeout if delimiter is None else None)
+                if delimiter is not None and end == 'timeout':
+                    resp_data, end = None, 'close'
+                    if self.telemetry is not None:
+                        self.telemetry.count('truncated_responses')
+                menu_received = bool(reader.trailing) or (delimiter is None and end == 'timeout')
+            except socket.timeout:
+                resp_data, end = None, 'close'
+                if self.telemetry is not None:
+                    self.telemetry.count('timeouts')
+            except OSError:
+                resp_data, end = None, 'close'
+            if self.telemetry is not None:
+                self.telemetry.record('request', time.perf_counter() - start)
+            with self._lock:
+                if not fresh and resp_data:
+                    self._reuse_successes += 1
+                elif not fresh:
+                    self._reuse_failures += 1
+            if resp_data:
+                # After a response on a kept-open session the server re-sends its menu, unless it
+                # already arrived together with the response.
+                conn.menu_pending = not menu_received
+                self.release(conn, reusable=(end != 'close'))
+                return resp_data
+            conn.stats.failures += 1
+            conn.close()
+            # Only a session that had been waiting in the pool may have been silently dropped;
+            # a failure on a connection established for this request is reported as is.
+            if attempt == 0 and conn.waited:
+                if self.telemetry is not None:
+                    self.telemetry.count('stale_session_retries')
+                continue
+            return None
+        return None
+
+    def request_batch(self, option: bytes, payloads):
+        """
+        Pipelines several option/data exchanges on one kept-open session: all requests are sent
+        at once and the answers are read back in order, so the connect, banner, prompt and
+        round-trip costs are paid once per batch instead of once per request.
+        
+        Only answers recognised by _is_trace_payload are returned, so this is meant for trace
+        requests (option 1). When the server does not keep sessions open, the exchanges are
+        made one by one with request().
+        
+        Pipelining assumes the server frames requests by length, not by timing: it reads exactly
+        one option byte and then exactly len(data) bytes per request, leaving the rest of the
+        batch queued in the socket, so prompts never need to be waited for. If a batch comes
+        back with fewer answers than requests, this assumption (or the session) broke and the
+        answers cannot be matched to their payloads: they are discarded and the batch is
+        re-issued one request at a time with request().
+        
+        Args:
+            option (bytes): The server option (b'1').
+            payloads (list): Data for each request (plaintexts).
+            
+        Returns:
+            list: One raw response per payload, in order; None for requests that failed.
+        """
+        if not self._keep_alive_enabled():
+            return [self.request(option, data) for data in payloads]
+        try:
+            conn = self.acquire()
+        except OSError:
+            return [None] * len(payloads)
+        fresh = conn.stats.requests == 0
+        conn.stats.requests += len(payloads)
+        conn.stats.reuse_count += len(payloads) - (1 if fresh else 0)
+        reader = _thread_response_reader()
+        start = time.perf_counter()
+        try:
+            # Pending menus and the per-request prompts are skipped while reading the answers.
+            conn.sock.sendall(b''.join(option + data for data in payloads))
+            answers, end = reader.read_payload_lines(conn.sock, len(payloads), _is_trace_payload)
+        except OSError:
+            answers, end = [], 'close'
+        if self.telemetry is not None:
+            self.telemetry.record('batch_request', time.perf_counter() - start)
+            if end == 'timeout':
+                self.telemetry.count('timeouts')
+        with self._lock:
+            if end != 'complete' and len(answers) <= 1:
+                self._reuse_failures += 1 # The server hung up after (at most) one answer
+            elif not fresh or len(answers) > 1:
+                self._reuse_successes += 1
+        if end == 'complete':
+            conn.menu_pending = not reader.trailing
+            self.release(conn, reusable=True)
+            return answers
+        conn.stats.failures += len(payloads) - len(answers)
+        conn.close()
+        if self.telemetry is not None:
+            self.telemetry.count('batch_fallbacks')
+        return [self.request(option, data) for data in payloads]
+
+    def stats(self):
+        """
+        Returns per-connection statistics and pool-wide totals.
+        
+        Returns:
+            dict: {'connections': [per-connection dicts], 'handshakes', 'handshake_failures',
+                   'requests', 'reused_requests', 'request_failures', 'mean_handshake_latency'}
+        """
+        with self._lock:
+            per_conn = [st.as_dict() for st in self._all_stats]
+            handshake_failures = self._handshake_failures
+        latencies = [c['handshake_latency'] for c in per_conn if c['handshake_latency'] is not None]
+        return {
+            'connections': per_conn,
+            'handshakes': len(per_conn),
+            'handshake_failures': handshake_failures,
+            'requests': sum(c['requests'] for c in per_conn),
+            'reused_requests': sum(c['reuse_count'] for c in per_conn),
+            'request_failures': sum(c['failures'] for c in per_conn),
+            'mean_handshake_latency': (sum(latencies) / len(latencies)) if latencies else None,
+        }
+
+    def print_stats(self):
+        """
+        Prints a one-line summary of the pool statistics.
+        """
+        st = self.stats()
+        mean_hs = st['mean_handshake_latency']
+        mean_hs_str = f"{mean_hs * 1000:.1f} ms" if mean_hs is not None else "n/a"
+        print(f"[*] Connection pool: {st['handshakes']} handshakes (mean {mean_hs_str}, "
+              f"{st['handshake_failures']} failed), {st['requests']} requests, "
+              f"{st['reused_requests']} on reused sessions, {st['request_failures']} failed.")
+
+    def close(self):
+        """
+        Stops the prefetch threads and closes all ready connections.
+        """
+        self._closed.set()
+        self._demand.set()
+        for t in self._prefetchers:
+            t.join(timeout=1.0)
+        for q in (self._idle, self._warm):
+            while True:
+                try:
+                    q.get_nowait().close()
+                except queue.Empty:
+                    break
+
 # --- Server Interaction Function ---
-def interact_with_server(option: bytes, data: bytes) -> bytes:
+def interact_with_server(option: bytes, data: bytes, pool=None) -> bytes:
     """
     Manages communication with the remote target server via a TCP socket.
     
@@ -65,11 +950,15 @@ def interact_with_server(option: bytes, data: bytes) -> bytes:
     Args:
         option (bytes): The byte string representing the server option ('1' or '2').
         data (bytes): The data to send based on the chosen option (plaintext or hex-encoded key).
+        pool (ConnectionPool): Optional connection pool. When given, the exchange runs over a
+                               pooled (reused or prefetched) session instead of a new connection.
         
     Returns:
         bytes: The raw response data received from the server (e.g., base64-encoded trace, flag).
                Returns None if any network or communication error occurs.
     """
+    if pool is not None:
+        return pool.request(option, data)
     try:
         # Create a new socket connection. `with` statement ensures proper closing.
         with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
@@ -95,25 +984,18 @@ def interact_with_server(option: bytes, data: bytes) -> bytes:
             # Send the actual data (plaintext or key) to the server.
             s.sendall(data)
 
-            # Receive the full response from the server.
-            # This loop continues receiving chunks of data until the server closes the connection
-            # or no more data is available (indicated by an empty chunk).
-            resp_data = b''
-            try:
-                while True:
-                    temp_data = s.recv(8096) # Receive data in larger chunks for efficiency
-                    if not temp_data:
-                        break # Server closed connection or sent no more data
-                    resp_data += temp_data
-                    # Small delay to yield control and allow server to send all data,
-                    # can sometimes help with network stability over flaky connections.
-                    time.sleep(0.001) 
-            except socket.timeout:
-                # If a timeout occurs during data reception, consider it a failure.
+            # Receive the response from the server into this thread's reusable buffer.
+            # It ends at the delimiter for this option (see RESPONSE_DELIMITERS) or when
+            # the server closes the connection; ConnectionPool.request and the asyncio
+            # client frame responses the same way.
+            resp_data, end = _thread_response_reader().read(s, delimiter=RESPONSE_DELIMITERS.get(option))
+            if end == 'timeout':
+                # If a timeout occurs during data reception, the payload may be truncated:
+                # consider it a failure.
                 return None 
 
             s.close() # Explicitly close the socket.
-            return resp_data
+            return resp_data if resp_data is not None else b''
     except socket.timeout as e:
         # Handle timeouts specifically for connection establishment or initial sends.
         return None 
@@ -133,113 +1015,896 @@ def random_ascii_plaintext():
     Returns:
         bytes: A 16-byte randomly generated plaintext.
     """
-    return bytes([random.randint(0, 255) for _ in range(16)])
+    return _default_plaintexts().next(1)[0].tobytes()
 
-# --- Single Trace Collection Function ---
-def collect_single_trace(i, retries=3):
+# --- Plaintext Campaigns ---
+# Plaintexts are drawn in blocks from a seeded NumPy generator instead of 16 random.randint calls
+# per trace. Row i of a campaign only depends on (seed, design, i): block i // BLOCK is generated
+# from the seed and the block number, so the same plaintexts come out however the requests were
+# batched or spread over threads. A recorded seed reproduces the sequence, not a trace store: rows
+# whose request failed are still issued and stored rows come in completion order, so the plaintexts
+# in a store are the authoritative record and the seed only lets a campaign continue without reuse.
+
+class PlaintextGenerator:
     """
-    Attempts to collect a single power trace and its corresponding plaintext from the server.
-    
-    Includes a retry mechanism to handle transient network issues or malformed responses.
+    Seeded, reproducible source of (n, 16) uint8 plaintext batches.
     
-    Args:
-        i (int): A unique identifier for the trace collection attempt (for logging).
-        retries (int): The number of times to retry if collection fails.
-        
-    Returns:
-        tuple: A tuple (plaintext, power_trace_numpy_array) on success.
-               Returns an error string on failure after all retries are exhausted.
+    Designs:
+        'random'  uniformly random plaintexts (CPA).
+        'tvla'    fixed-vs-random: each row is the fixed plaintext or a random one with equal
+                  probability, for Welch t-test leakage assessment. is_fixed() tells the groups apart.
+        'chosen'  the bytes in 'chosen_bytes' step through 0..255 together (row i has value i % 256),
+                  all other bytes keep the fixed plaintext, so every value is hit equally often.
     """
-    for attempt in range(retries):
-        pt = random_ascii_plaintext() # Generate a new random plaintext for each attempt
-        raw = interact_with_server(b'1', pt) # Request a trace for this plaintext
-        
-        if raw is None:
-            # If interact_with_server returns None, it indicates a network/connection issue.
-            time.sleep(0.1) # Wait briefly before retrying for network stability
-            continue # Try again if retries remain
-        
-        try:
-            # Attempt to decode the raw response into a NumPy array trace.
-            # b64_decode_trace now includes checks for empty arrays.
-            trace = b64_decode_trace(raw) 
-            return (pt, trace) # Return successful plaintext and trace
-        except ValueError as e:
-            # Catch specific ValueErrors (e.g., bad base64, empty trace)
-            time.sleep(0.1) # Wait briefly before retry
-            continue # Try again if retries remain
-        except Exception as e:
-            # Catch any other unexpected errors during processing
-            time.sleep(0.1)
-            continue
+    BLOCK = 4096
+    DESIGNS = ('random', 'tvla', 'chosen')
 
-    # If all retries fail, return a descriptive error message
-    return f"Failed after {retries} attempts: check server or network. (Trace ID {i})"
+    def __init__(self, seed=None, design='random', fixed=None, chosen_bytes=None):
+        """
+        Args:
+            seed (int): Campaign seed. A fresh one is drawn (and can be read back from 'seed') if None.
+            design (str): One of DESIGNS.
+            fixed (bytes): Fixed plaintext of the 'tvla' and 'chosen' designs. Derived from the seed if None.
+            chosen_bytes (list): Byte positions varied by the 'chosen' design (default: all 16).
+        """
+        if design not in self.DESIGNS:
+            raise ValueError(f"Unknown plaintext design '{design}', expected one of {self.DESIGNS}.")
+        self.seed = int(np.random.SeedSequence().entropy) if seed is None else int(seed)
+        self.design = design
+        if fixed is None:
+            fixed = np.random.default_rng([self.seed, 0]).integers(0, 256, 16, dtype=np.uint8)
+        self.fixed = np.frombuffer(bytes(fixed), dtype=np.uint8).copy()
+        if self.fixed.shape != (16,):
+            raise ValueError("The fixed plaintext must be 16 bytes long.")
+        self.chosen_bytes = np.arange(16) if chosen_bytes is None else np.unique(np.asarray(chosen_bytes, dtype=np.intp))
+        self.issued = 0 # Rows handed out by next()
+        self._lock = threading.Lock()
+        self._cached_index = None
+        self._cached_block = None
 
-# --- Parallel Trace Collection Function ---
-def collect_traces_parallel(n=1000, workers=20, max_overall_attempts_factor=5):
+    @classmethod
+    def from_state(cls, state):
+        """
+        Recreates a generator from state(), continuing after the rows it had issued.
+        """
+        generator = cls(seed=state['seed'], design=state['design'], fixed=bytes.fromhex(state['fixed']),
+                        chosen_bytes=state['chosen_bytes'])
+        generator.issued = state.get('issued', 0)
+        return generator
+
+    @classmethod
+    def from_store(cls, path):
+        """
+        Recreates the generator recorded in a TraceStore's meta.json (see TraceStore.track_plaintexts),
+        continuing after the rows it had issued. This is for extending a campaign; the store's own
+        plaintexts, not the generator, tell which plaintext belongs to which trace.
+        """
+        with open(os.path.join(path, TraceStore.META_FILE)) as f:
+            state = json.load(f).get('plaintexts')
+        if state is None:
+            raise ValueError(f"Trace store {path} has no recorded plaintext campaign.")
+        return cls.from_state(state)
+
+    def state(self):
+        """
+        Returns the JSON-serialisable campaign description (seed, design and rows issued).
+        """
+        return {
+            'seed': self.seed,
+            'design': self.design,
+            'fixed': self.fixed.tobytes().hex(),
+            'chosen_bytes': self.chosen_bytes.tolist(),
+            'issued': self.issued,
+        }
+
+    def _block(self, index):
+        if index != self._cached_index:
+            rng = np.random.default_rng([self.seed, 1, index])
+            if self.design == 'chosen':
+                block = np.tile(self.fixed, (self.BLOCK, 1))
+                values = (index * self.BLOCK + np.arange(self.BLOCK)) % 256
+                block[:, self.chosen_bytes] = values[:, None]
+            else:
+                block = rng.integers(0, 256, (self.BLOCK, 16), dtype=np.uint8)
+                if self.design == 'tvla':
+                    block[rng.random(self.BLOCK) < 0.5] = self.fixed
+            self._cached_index, self._cached_block = index, block
+        return self._cached_block
+
+    def plaintexts(self, start, count):
+        """
+        Returns rows start..start+count-1 of the campaign as a (count, 16) uint8 matrix.
+        Does not change 'issued'.
+        """
+        out = np.empty((count, 16), dtype=np.uint8)
+        with self._lock:
+            row = 0
+            while row < count:
+                index, offset = divmod(start + row, self.BLOCK)
+                take = min(count - row, self.BLOCK - offset)
+                out[row:row + take] = self._block(index)[offset:offset + take]
+                row += take
+        return out
+
+    def next(self, count):
+        """
+        Hands out the next 'count' rows of the campaign (thread-safe).
+        """
+        with self._lock:
+            start = self.issued
+            self.issued += count
+        return self.plaintexts(start, count)
+
+    def is_fixed(self, plaintexts):
+        """
+        Returns a boolean mask of the rows equal to the fixed plaintext (the 'tvla' fixed group).
+        """
+        return np.all(plaintext_matrix(plaintexts) == self.fixed, axis=1)
+
+_default_generator = None
+_default_generator_lock = threading.Lock()
+
+def _default_plaintexts():
     """
-    Collects a specified number of power traces ('n') in parallel using a ThreadPoolExecutor.
-    
-    This function is designed to be robust against individual trace collection failures
-    by continuously submitting new tasks until 'n' successful traces are acquired
-    or a global limit on total attempts is reached.
-    
-    Args:
-        n (int): The target number of successful traces to collect.
-        workers (int): The maximum number of concurrent threads for collection.
-        max_overall_attempts_factor (int): Multiplier for 'n' to set the hard limit
-                                           on total collection attempts.
+    Returns the process-wide generator used when a collector is not given one.
+    """
+    global _default_generator
+    with _default_generator_lock:
+        if _default_generator is None:
+            _default_generator = PlaintextGenerator()
+        return _default_generator
+
+# --- On-Disk Trace Store ---
+# Collections of 100k traces do not fit in RAM as a list of arrays, and a crash used to lose
+# the whole campaign. The store keeps traces and plaintexts in preallocated, memory-mapped
+# .npy matrices that the collectors append to while they run. A small meta.json records how
+# many rows are committed (flushed to disk), so an interrupted campaign resumes from there.
+
+class TraceStore:
+    """
+    Append-only on-disk store of (plaintext, trace) pairs.
     
-    Returns:
-        tuple: A tuple (list_of_plaintexts, list_of_traces) containing all successfully collected data.
+    Directory layout:
+        traces.npy      (capacity, samples) trace matrix, memory-mapped
+        plaintexts.npy  (capacity, 16) uint8 plaintext matrix, memory-mapped
+        meta.json       number of committed rows, plus campaign metadata
+        
+    Only rows below the committed count are considered valid; rows written after the last
+    commit are overwritten when the store is reopened.
     """
-    print(f"[*] Collecting {n} traces with {workers} threads...")
-    traces = []
-    pts = []
-    current_trace_id = 0 # Unique ID for each trace collection request (useful for debugging)
-    successful_traces_count = 0
-    total_attempts_made = 0
-    # Calculate the maximum total attempts allowed to prevent infinite loops
-    max_total_attempts = n * max_overall_attempts_factor 
+    TRACES_FILE = 'traces.npy'
+    PLAINTEXTS_FILE = 'plaintexts.npy'
+    META_FILE = 'meta.json'
 
-    with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {} # Dictionary to hold active futures: {future_object: unique_trace_id}
+    def __init__(self, path, capacity=1000, commit_every=100, target=None):
+        """
+        Opens the store at 'path', resuming from its committed rows if it already exists.
+        The matrices themselves are created on the first append, once the trace length is known.
+        
+        Args:
+            path (str): Store directory (created if missing).
+            capacity (int): Initial number of rows to preallocate for a new store.
+            commit_every (int): Number of appended rows between automatic commits.
+            target (str): Optional description of the target (e.g. 'host:port'), recorded in the
+                          metadata. A warning is printed when resuming a store recorded for another target.
+        """
+        self.path = path
+        self.commit_every = commit_every
+        self.count = 0 # Rows appended (committed or not)
+        self.committed = 0 # Rows guaranteed to be on disk
+        self.meta = {'target': target}
+        self.plaintext_generator = None
+        self._initial_capacity = capacity
+        self._traces = None
+        self._plaintexts = None
+        os.makedirs(path, exist_ok=True)
 
-        # Initial population of the worker pool: submit enough tasks to fill the workers
-        while len(futures) < workers and current_trace_id < max_total_attempts:
-            future = executor.submit(collect_single_trace, current_trace_id)
-            futures[future] = current_trace_id
-            current_trace_id += 1
-            total_attempts_made += 1
+        meta_path = self._file(self.META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.meta = json.load(f)
+            self.count = self.committed = self.meta.get('count', 0)
+            if target is not None and self.meta.get('target') not in (None, target):
+                print(f"[!] Trace store {path} was recorded for target {self.meta.get('target')}, not {target}.")
+            if os.path.exists(self._file(self.TRACES_FILE)):
+                self._open_maps()
 
-        # Main loop to manage futures and collect traces
-        while successful_traces_count < n and futures:
-            # Use as_completed to get futures as they complete, allowing dynamic submission
-            for future in as_completed(futures.keys()):
-                original_trace_id = futures.pop(future) # Remove the completed future from active list
-                result = future.result() # Get the result of the completed task
+    @property
+    def capacity(self):
+        return 0 if self._traces is None else self._traces.shape[0]
 
-                if isinstance(result, tuple) and len(result) == 2:
-                    # If successful, append the plaintext and trace
-                    pt, tr = result
-                    pts.append(pt)
-                    traces.append(tr)
-                    successful_traces_count += 1
-                    # Provide periodic updates on progress
-                    if successful_traces_count % 100 == 0:
-                        print(f"[*] Collected {successful_traces_count}/{n} traces successfully...")
-                else:
+    @property
+    def num_samples(self):
+        """
+        Length of the stored traces, or None until the first trace was appended.
+        """
+        return None if self._traces is None else self._traces.shape[1]
+
+    @property
+    def traces(self):
+        """
+        Committed and appended traces as a zero-copy (count, samples) view of the memory map.
+        """
+        if self._traces is None:
+            return np.empty((0, 0))
+        return self._traces[:self.count]
+
+    @property
+    def plaintexts(self):
+        """
+        Plaintexts as a zero-copy (count, 16) uint8 view of the memory map.
+        """
+        if self._plaintexts is None:
+            return np.empty((0, 16), dtype=np.uint8)
+        return self._plaintexts[:self.count]
+
+    def _file(self, name):
+        return os.path.join(self.path, name)
+
+    def _open_maps(self):
+        self._traces = np.lib.format.open_memmap(self._file(self.TRACES_FILE), mode='r+')
+        self._plaintexts = np.lib.format.open_memmap(self._file(self.PLAINTEXTS_FILE), mode='r+')
+
+    def _create(self, capacity, num_samples, dtype, suffix=''):
+        traces = np.lib.format.open_memmap(
+            self._file(self.TRACES_FILE) + suffix, mode='w+', dtype=dtype, shape=(capacity, num_samples))
+        plaintexts = np.lib.format.open_memmap(
+            self._file(self.PLAINTEXTS_FILE) + suffix, mode='w+', dtype=np.uint8, shape=(capacity, 16))
+        return traces, plaintexts
+
+    def ensure_capacity(self, capacity):
+        """
+        Grows the preallocated matrices to at least 'capacity' rows (copying the existing rows),
+        or sets the size the matrices will be created with.
+        """
+        if self._traces is None:
+            self._initial_capacity = max(self._initial_capacity, capacity)
+            return
+        if capacity <= self.capacity:
+            return
+        self.commit()
+        # Write the larger matrices next to the current ones, then swap them in.
+        traces, plaintexts = self._create(capacity, self._traces.shape[1], self._traces.dtype, suffix='.grow')
+        traces[:self.count] = self._traces[:self.count]
+        plaintexts[:self.count] = self._plaintexts[:self.count]
+        traces.flush()
+        plaintexts.flush()
+        del traces, plaintexts
+        self._traces = self._plaintexts = None # Release the old memory maps before replacing the files
+        for name in (self.TRACES_FILE, self.PLAINTEXTS_FILE):
+            os.replace(self._file(name) + '.grow', self._file(name))
+        self._open_maps()
+
+    def append(self, pt, trace):
+        """
+        Appends one (plaintext, trace) pair, committing every 'commit_every' rows.
+        
+        Args:
+            pt (bytes): The 16-byte plaintext.
+            trace (numpy.ndarray): The decoded power trace.
+            
+        Raises:
+            ValueError: If the trace length differs from the traces already in the store.
+        """
+        if self._traces is None:
+            self._traces, self._plaintexts = self._create(max(self._initial_capacity, 1), trace.shape[0], trace.dtype)
+        if trace.shape[0] != self._traces.shape[1]:
+            raise ValueError(f"Trace has {trace.shape[0]} samples, store expects {self._traces.shape[1]}.")
+        if self.count == self.capacity:
+            self.ensure_capacity(2 * self.capacity)
+        self._traces[self.count] = trace
+        self._plaintexts[self.count] = np.frombuffer(pt, dtype=np.uint8)
+        self.count += 1
+        if self.count - self.committed >= self.commit_every:
+            self.commit()
+
+    def append_batch(self, pts, traces):
+        """
+        Appends a batch of pairs with one block copy per matrix, committing every 'commit_every' rows.
+        
+        Args:
+            pts: (m, 16) plaintext matrix or list of 16-byte plaintexts.
+            traces (numpy.ndarray): (m, samples) trace matrix.
+            
+        Raises:
+            ValueError: If the trace length differs from the traces already in the store.
+        """
+        m = len(traces)
+        if m == 0:
+            return
+        if self._traces is None:
+            self._traces, self._plaintexts = self._create(max(self._initial_capacity, m), traces.shape[1], traces.dtype)
+        if traces.shape[1] != self._traces.shape[1]:
+            raise ValueError(f"Traces have {traces.shape[1]} samples, store expects {self._traces.shape[1]}.")
+        if self.count + m > self.capacity:
+            self.ensure_capacity(max(2 * self.capacity, self.count + m))
+        self._traces[self.count:self.count + m] = traces
+        self._plaintexts[self.count:self.count + m] = plaintext_matrix(pts)
+        self.count += m
+        if self.count - self.committed >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        """
+        Flushes the appended rows to disk, then records them as committed in meta.json.
+        The metadata is replaced atomically, so it never counts rows that are not on disk.
+        """
+        if self._traces is not None:
+            self._traces.flush()
+            self._plaintexts.flush()
+        self.meta['count'] = self.count
+        if self.plaintext_generator is not None:
+            self.meta['plaintexts'] = self.plaintext_generator.state()
+        meta_path = self._file(self.META_FILE)
+        with open(meta_path + '.tmp', 'w') as f:
+            json.dump(self.meta, f)
+        os.replace(meta_path + '.tmp', meta_path)
+        self.committed = self.count
+
+    def track_plaintexts(self, generator):
+        """
+        Records the campaign of a PlaintextGenerator in meta.json (refreshed on every commit), so
+        PlaintextGenerator.from_store(path) can continue it. When resuming a store recorded with the
+        same seed and design, the generator continues after the rows already issued.
+        
+        The recorded state cannot reproduce the stored rows: 'issued' also counts requests that
+        failed, and rows are stored in the order they completed. The stored plaintexts remain
+        the authoritative record of the campaign.
+        """
+        recorded = self.meta.get('plaintexts')
+        if recorded is not None:
+            if (recorded['seed'], recorded['design']) == (generator.seed, generator.design):
+                generator.issued = max(generator.issued, recorded.get('issued', 0))
+            else:
+                print(f"[!] Trace store {self.path} was recorded with plaintext seed {recorded['seed']} "
+                      f"({recorded['design']}), now using seed {generator.seed} ({generator.design}).")
+        self.plaintext_generator = generator
+        self.commit()
+
+    def close(self):
+        """
+        Commits outstanding rows and releases the memory maps.
+        """
+        self.commit()
+        self._traces = self._plaintexts = None
+
+def load_trace_store(path):
+    """
+    Opens a trace store read-only for analysis.
+    
+    Args:
+        path (str): Store directory written by TraceStore.
+        
+    Returns:
+        tuple: (plaintexts, traces) as read-only np.memmap views of the committed rows,
+               shaped (count, 16) and (count, samples).
+    """
+    with open(os.path.join(path, TraceStore.META_FILE)) as f:
+        count = json.load(f).get('count', 0)
+    traces = np.load(os.path.join(path, TraceStore.TRACES_FILE), mmap_mode='r')
+    plaintexts = np.load(os.path.join(path, TraceStore.PLAINTEXTS_FILE), mmap_mode='r')
+    return plaintexts[:count], traces[:count]
+
+# --- Collected Trace Sink ---
+class _TraceSink:
+    """
+    Destination for traces collected by collect_traces_parallel/collect_traces_async:
+    either in-memory lists or a TraceStore written to as traces arrive.
+    """
+    def __init__(self, n, store=None, online_cpa=None, plaintext_generator=None):
+        self.n = n
+        self.store = store
+        self.online_cpa = online_cpa
+        self.pts = []
+        self.traces = []
+        if store is not None:
+            store.ensure_capacity(n)
+            if plaintext_generator is not None:
+                store.track_plaintexts(plaintext_generator)
+            if store.count:
+                print(f"[*] Resuming from {store.count} committed traces in {store.path}.")
+                if online_cpa is not None:
+                    online_cpa.update(store.plaintexts, store.traces)
+
+    @property
+    def done(self):
+        """
+        True once 'n' traces were collected or the online CPA has converged.
+        """
+        return self.count >= self.n or (self.online_cpa is not None and self.online_cpa.converged)
+
+    @property
+    def count(self):
+        return self.store.count if self.store is not None else len(self.pts)
+
+    @property
+    def num_samples(self):
+        """
+        Length every collected trace must have: that of the store, or of the first trace
+        collected. None until it is known.
+        """
+        if self.store is not None:
+            return self.store.num_samples
+        return len(self.traces[0]) if self.traces else None
+
+    def add(self, pt, trace):
+        """
+        Records one collected pair. Pairs beyond the target 'n' (from requests still in
+        flight when the target was reached) are dropped.
+        
+        Returns:
+            int: 1 if the trace was rejected because its length differs from num_samples, else 0.
+        """
+        if self.done:
+            return 0
+        expected = self.num_samples
+        if expected is not None and len(trace) != expected:
+            return 1
+        if self.store is not None:
+            self.store.append(pt, trace)
+        else:
+            self.pts.append(pt)
+            self.traces.append(trace)
+        if self.online_cpa is not None:
+            self.online_cpa.add(pt, trace)
+        return 0
+
+    def add_batch(self, pts, traces):
+        """
+        Records a batch of pairs, with 'traces' as one (m, samples) matrix. In memory, the
+        stored traces are row views of that matrix; a store receives it as one block.
+        
+        Returns:
+            int: Number of traces rejected because their length differs from num_samples
+                 (the whole batch, since all its rows have the same length).
+        """
+        if self.done:
+            return 0
+        expected = self.num_samples
+        if expected is not None and traces.shape[1] != expected:
+            return len(traces)
+        remaining = self.n - self.count
+        pts, traces = pts[:remaining], traces[:remaining]
+        if self.store is not None:
+            self.store.append_batch(pts, traces)
+        else:
+            self.pts.extend(bytes(pt) for pt in pts)
+            self.traces.extend(traces)
+        if self.online_cpa is not None:
+            for pt, trace in zip(pts, traces):
+                self.online_cpa.add(bytes(pt), trace)
+        return 0
+
+    def result(self):
+        """
+        Returns (plaintexts, traces): the lists, or zero-copy views of the store.
+        """
+        if self.store is not None:
+            self.store.commit()
+            return self.store.plaintexts, self.store.traces
+        return self.pts, self.traces
+
+def _report_length_mismatch(i, rejected, num_samples, telemetry=None):
+    """
+    Reports traces dropped by _TraceSink for a wrong length. They were requested before the
+    trace length was known, so their task could not check it while decoding.
+    """
+    print(f"[!] Trace request ID {i}: {rejected} trace(s) dropped, expected {num_samples} samples.")
+    if telemetry is not None:
+        telemetry.count('decode_errors', rejected)
+
+# --- Adaptive Concurrency and Retry Backoff ---
+# A fixed worker count is a guess: too many in-flight requests make the server time out, too
+# few leave bandwidth unused. The controller below adjusts the in-flight limit while collecting,
+# the way TCP adjusts its congestion window: +1 after every healthy round of requests, and a
+# multiplicative cut when a round shows failures or inflated latency. Retries back off
+# exponentially with full jitter instead of a fixed 0.1 s sleep, so failing requests do not
+# come back in lockstep and hit an overloaded server again all at once.
+
+# Retry n (0-based) waits a random time in [0, min(RETRY_BACKOFF_CAP, RETRY_BACKOFF_BASE * 2**n)].
+RETRY_BACKOFF_BASE = 0.05
+RETRY_BACKOFF_CAP = 2.0
+
+def backoff_delay(attempt, base=RETRY_BACKOFF_BASE, cap=RETRY_BACKOFF_CAP):
+    """
+    Returns the exponential backoff with full jitter before retry number 'attempt' (0-based).
+    """
+    return random.uniform(0.0, min(cap, base * (2 ** attempt)))
+
+class ConcurrencyController:
+    """
+    AIMD (additive-increase, multiplicative-decrease) limit on the number of requests in flight.
+    
+    Outcomes are evaluated in rounds of 'limit' completed requests (about one round trip at the
+    current concurrency). A round is congested if its failure rate exceeds 'max_failure_rate'
+    or its mean latency exceeds 'latency_tolerance' times the baseline latency.
+    A congested round multiplies the limit by 'decrease_factor' (at most once per 'cooldown'
+    seconds, since requests started before a reduction keep failing for a while); any other
+    round raises it by one, up to 'maximum'. Thread-safe.
+    
+    The baseline is the mean latency of the first 'warmup_rounds' rounds, during which only the
+    failure rate is checked. Afterwards every round moves it by 'baseline_decay' towards the
+    round's mean, so it follows a lasting change of the server's speed (a limit stuck at the
+    minimum after a permanent slowdown recovers) while a short spike barely shifts it.
+    Decreases are counted in the telemetry as 'congestion_failures' or 'congestion_latency'.
+    """
+    def __init__(self, initial, minimum=4, maximum=None, cooldown=5.0, max_failure_rate=0.1,
+                 latency_tolerance=3.0, decrease_factor=0.5, warmup_rounds=3, baseline_decay=0.05,
+                 telemetry=None):
+        """
+        Args:
+            initial (int): Starting in-flight limit.
+            minimum (int): Lower bound of the limit.
+            maximum (int): Upper bound of the limit (defaults to 'initial').
+            cooldown (float): Minimum time in seconds between two decreases.
+            max_failure_rate (float): Failure rate of a round above which the round is congested.
+            latency_tolerance (float): Latency inflation over the baseline above which the round
+                                       is congested. None disables the latency signal.
+            decrease_factor (float): Multiplier applied to the limit on congestion.
+            warmup_rounds (int): Number of rounds averaged into the initial latency baseline.
+            baseline_decay (float): Weight of each later round's mean latency in the baseline.
+            telemetry (AcquisitionTelemetry): Optional telemetry counting the decreases.
+        """
+        self.maximum = maximum if maximum is not None else initial
+        self.minimum = max(1, min(minimum, initial))
+        self.limit = initial
+        self.cooldown = cooldown
+        self.max_failure_rate = max_failure_rate
+        self.latency_tolerance = latency_tolerance
+        self.decrease_factor = decrease_factor
+        self.warmup_rounds = max(1, warmup_rounds)
+        self.baseline_decay = baseline_decay
+        self.telemetry = telemetry
+        self.base_latency = None # Latency baseline; None until the warm-up rounds are complete
+        self.history = [(0.0, initial)] # (seconds since start, limit) after every change
+        self._warmup_latencies = []
+        self._successes = 0
+        self._failures = 0
+        self._latency_sum = 0.0
+        self._latency_count = 0
+        self._started = time.monotonic()
+        self._last_decrease = float('-inf')
+        self._lock = threading.Lock()
+
+    def on_success(self, latency=None):
+        """
+        Records a completed request and its latency in seconds (if measured).
+        """
+        with self._lock:
+            self._successes += 1
+            if latency is not None:
+                self._latency_sum += latency
+                self._latency_count += 1
+            self._evaluate()
+
+    def on_failure(self):
+        """
+        Records a failed request (timeout, dropped connection or unusable answer).
+        """
+        with self._lock:
+            self._failures += 1
+            self._evaluate()
+
+    def _evaluate(self):
+        completed = self._successes + self._failures
+        if completed < self.limit:
+            return
+        failure_rate = self._failures / completed
+        mean_latency = self._latency_sum / self._latency_count if self._latency_count else None
+        self._successes = self._failures = self._latency_count = 0
+        self._latency_sum = 0.0
+
+        inflated = False
+        if mean_latency is not None:
+            if self.base_latency is None:
+                self._warmup_latencies.append(mean_latency)
+                if len(self._warmup_latencies) >= self.warmup_rounds:
+                    self.base_latency = sum(self._warmup_latencies) / len(self._warmup_latencies)
+            else:
+                inflated = (self.latency_tolerance is not None
+                            and mean_latency > self.latency_tolerance * self.base_latency)
+                self.base_latency += self.baseline_decay * (mean_latency - self.base_latency)
+        now = time.monotonic()
+        if failure_rate > self.max_failure_rate or inflated:
+            if now - self._last_decrease >= self.cooldown and self.limit > self.minimum:
+                self._last_decrease = now
+                self.limit = max(self.minimum, int(self.limit * self.decrease_factor))
+                self.history.append((now - self._started, self.limit))
+                if self.telemetry is not None:
+                    self.telemetry.count('congestion_failures' if failure_rate > self.max_failure_rate
+                                         else 'congestion_latency')
+        elif self.limit < self.maximum:
+            self.limit += 1
+            self.history.append((now - self._started, self.limit))
+
+# --- Single Trace Collection Function ---
+def _retry_pause(attempt, telemetry=None):
+    """
+    Waits with exponential backoff and jitter before a retry, recording the time as the
+    'retry_sleep' phase.
+    """
+    delay = backoff_delay(attempt)
+    time.sleep(delay)
+    if telemetry is not None:
+        telemetry.record('retry_sleep', delay)
+
+def collect_single_trace(i, retries=3, pool=None, plaintext_generator=None, telemetry=None, controller=None,
+                         num_samples=None):
+    """
+    Attempts to collect a single power trace and its corresponding plaintext from the server.
+    
+    Includes a retry mechanism to handle transient network issues or malformed responses.
+    
+    Args:
+        i (int): A unique identifier for the trace collection attempt (for logging).
+        retries (int): The number of times to retry if collection fails.
+        pool (ConnectionPool): Optional connection pool to run the requests over.
+        plaintext_generator (PlaintextGenerator): Source of the plaintexts (the process-wide
+                                                  random generator if None).
+        telemetry (AcquisitionTelemetry): Optional telemetry receiving the 'decode', 'retry_sleep'
+                                          and 'trace' latencies and the failure counters.
+        controller (ConcurrencyController): Optional controller informed of every attempt's outcome.
+        num_samples (int): Expected trace length. A trace of another length (e.g. a truncated
+                           response) counts as a decode error and is retried. Any length if None.
+        
+    Returns:
+        tuple: A tuple (plaintext, power_trace_numpy_array) on success.
+               Returns an error string naming the last failure after all retries are exhausted.
+    """
+    generator = plaintext_generator or _default_plaintexts()
+    start = time.perf_counter()
+    last_error = "no attempt made"
+    for attempt in range(retries):
+        if attempt and telemetry is not None:
+            telemetry.count('retries')
+        pt = generator.next(1)[0].tobytes() # Use a new plaintext for each attempt
+        request_start = time.perf_counter()
+        raw = interact_with_server(b'1', pt, pool=pool) # Request a trace for this plaintext
+        
+        if raw is None:
+            # If interact_with_server returns None, it indicates a network/connection issue.
+            last_error = "no response (connection failed, timed out or was closed)"
+            if telemetry is not None:
+                telemetry.count('no_response')
+            if controller is not None:
+                controller.on_failure()
+            _retry_pause(attempt, telemetry) # Back off before retrying for network stability
+            continue # Try again if retries remain
+        
+        decode_start = time.perf_counter()
+        try:
+            # Attempt to decode the raw response into a NumPy array trace.
+            # b64_decode_trace now includes checks for empty arrays and the trace length.
+            trace = b64_decode_trace(raw, num_samples=num_samples)
+        except ValueError as e:
+            # Catch specific ValueErrors (e.g., bad base64, empty trace)
+            last_error = str(e)
+            if telemetry is not None:
+                telemetry.count('decode_errors')
+            if controller is not None:
+                controller.on_failure()
+            _retry_pause(attempt, telemetry) # Back off before retry
+            continue # Try again if retries remain
+        except Exception as e:
+            # Catch any other unexpected errors during processing
+            last_error = f"unexpected error: {e!r}"
+            if telemetry is not None:
+                telemetry.count('unexpected_errors')
+            if controller is not None:
+                controller.on_failure()
+            _retry_pause(attempt, telemetry)
+            continue
+        if controller is not None:
+            controller.on_success(decode_start - request_start)
+        if telemetry is not None:
+            end = time.perf_counter()
+            telemetry.record('decode', end - decode_start)
+            telemetry.record('trace', end - start)
+        return (pt, trace) # Return successful plaintext and trace
+
+    # If all retries fail, return a descriptive error message
+    if telemetry is not None:
+        telemetry.count('failed_tasks')
+    return f"Failed after {retries} attempts, last error: {last_error}. (Trace ID {i})"
+
+# --- Batched Trace Collection Function ---
+def collect_trace_batch(i, batch_size, retries=3, pool=None, plaintext_generator=None, telemetry=None,
+                        controller=None, num_samples=None):
+    """
+    Collects up to 'batch_size' traces with one pipelined batch of requests on a pooled session.
+    
+    Args:
+        i (int): A unique identifier for the batch (for logging).
+        batch_size (int): Number of plaintexts sent in the batch.
+        retries (int): The number of times to retry if the whole batch fails.
+        pool (ConnectionPool): Connection pool providing the session.
+        plaintext_generator (PlaintextGenerator): Source of the plaintexts, as in collect_single_trace.
+        telemetry (AcquisitionTelemetry): Optional telemetry, as in collect_single_trace.
+        controller (ConcurrencyController): Optional controller informed of every batch's outcome
+                                            (a batch counts as one request).
+        num_samples (int): Expected trace length, as in collect_single_trace. If None, the
+                           first decodable answer of the batch sets it.
+        
+    Returns:
+        tuple: (plaintext_matrix, trace_matrix, elapsed_seconds) if at least one trace was
+               collected, as (m, 16) and (m, samples) matrices. Unanswered or malformed
+               responses are left out. Returns an error string on failure after all retries
+               are exhausted.
+    """
+    generator = plaintext_generator or _default_plaintexts()
+    for attempt in range(retries):
+        if attempt and telemetry is not None:
+            telemetry.count('retries')
+        start = time.perf_counter()
+        pts = generator.next(batch_size)
+        responses = pool.request_batch(b'1', [pt.tobytes() for pt in pts])
+        decode_start = time.perf_counter()
+        traces, valid = b64_decode_traces(responses, num_samples=num_samples)
+        if telemetry is not None:
+            end = time.perf_counter()
+            telemetry.record('decode', end - decode_start)
+            unanswered = sum(raw is None for raw in responses)
+            if unanswered:
+                telemetry.count('no_response', unanswered)
+            if len(responses) - unanswered - int(valid.sum()):
+                telemetry.count('decode_errors', len(responses) - unanswered - int(valid.sum()))
+            if valid.any():
+                telemetry.record('batch', end - start)
+        if controller is not None:
+            # A batch that lost more than the tolerated share of its answers counts as failed.
+            if valid.mean() >= 1.0 - controller.max_failure_rate:
+                controller.on_success(decode_start - start)
+            else:
+                controller.on_failure()
+        if valid.any():
+            if not valid.all():
+                pts = pts[valid]
+                traces = traces[valid]
+            return pts, traces, time.perf_counter() - start
+        _retry_pause(attempt, telemetry)
+
+    if telemetry is not None:
+        telemetry.count('failed_tasks')
+    return f"Failed after {retries} attempts: no trace in any answer. (Batch ID {i})"
+
+# --- Parallel Trace Collection Function ---
+def collect_traces_parallel(n=1000, workers=20, max_overall_attempts_factor=5, pool=None, store=None,
+                            online_cpa=None, batch_size=1, plaintext_generator=None, telemetry=None,
+                            adaptive=True, max_workers=None):
+    """
+    Collects a specified number of power traces ('n') in parallel using a ThreadPoolExecutor.
+    
+    This function is designed to be robust against individual trace collection failures
+    by continuously submitting new tasks until 'n' successful traces are acquired
+    or a global limit on total attempts is reached.
+    
+    Args:
+        n (int): The target number of successful traces to collect.
+        workers (int): The number of concurrent tasks to start with (the fixed number if not 'adaptive').
+        max_overall_attempts_factor (int): Multiplier for 'n' to set the hard limit
+                                           on total collection attempts.
+        pool (ConnectionPool): Connection pool shared by the workers. If None, a pool sized
+                               to the maximum number of tasks is created for this collection
+                               and closed afterwards.
+        store (TraceStore): Optional on-disk store. Traces are appended to it as they arrive,
+                            and collection resumes from the traces it already holds.
+        online_cpa (OnlineCpa): Optional online CPA fed with every collected trace. Collection
+                                stops early once it has converged.
+        batch_size (int): Number of plaintexts each task pipelines on one pooled session
+                          (collect_trace_batch). 1 sends one request per task.
+        plaintext_generator (PlaintextGenerator): Seeded plaintext source; its campaign is recorded
+                                                  in the store's metadata. Random if None.
+        telemetry (AcquisitionTelemetry): Optional telemetry for the run. It is also attached to
+                                          the pool (if the pool has none) for the connect and
+                                          request latencies, and its progress callback is fed
+                                          after every completed task.
+        adaptive (bool): Adjust the number of concurrent tasks between 4 and 'max_workers' with a
+                         ConcurrencyController, based on the observed failure rate and latency.
+        max_workers (int): Upper bound for the adaptive number of tasks (default: 4 * workers).
+    
+    Returns:
+        tuple: A tuple (list_of_plaintexts, list_of_traces) containing all successfully collected data.
+               With a store, (plaintexts, traces) are (count, 16) and (count, samples) views of it.
+    """
+    if batch_size > 1:
+        print(f"[*] Collecting {n} traces with {workers} threads in batches of {batch_size}...")
+    else:
+        print(f"[*] Collecting {n} traces with {workers} threads...")
+    plaintext_generator = plaintext_generator or _default_plaintexts()
+    sink = _TraceSink(n, store, online_cpa, plaintext_generator)
+    current_trace_id = 0 # Unique ID for each trace collection request (useful for debugging)
+    successful_traces_count = sink.count # Non-zero when resuming from a store
+    total_attempts_made = 0
+    # Calculate the maximum total attempts allowed to prevent infinite loops
+    max_total_attempts = (n - successful_traces_count) * max_overall_attempts_factor 
+
+    controller = None
+    max_tasks = workers
+    if adaptive:
+        max_tasks = max_workers if max_workers is not None else 4 * workers
+        controller = ConcurrencyController(workers, minimum=4, maximum=max_tasks, telemetry=telemetry)
+
+    own_pool = pool is None
+    if own_pool:
+        pool = ConnectionPool(size=max_tasks, prefetch=max(1, workers // 4), telemetry=telemetry)
+    attach_telemetry = telemetry is not None and pool.telemetry is None
+    if attach_telemetry:
+        pool.telemetry = telemetry
+    if telemetry is not None:
+        telemetry.start()
+
+    batch_seconds = 0.0 # Time spent in batches, for the amortised per-trace latency
+    batch_traces = 0
+
+    def task_limit():
+        return controller.limit if controller is not None else workers
+
+    with ThreadPoolExecutor(max_workers=max_tasks) as executor:
+        futures = {} # Dictionary to hold active futures: {future_object: unique_trace_id}
+
+        def submit_task():
+            # A batch counts as 'batch_size' attempts towards the overall limit.
+            nonlocal current_trace_id, total_attempts_made
+            if batch_size > 1:
+                future = executor.submit(collect_trace_batch, current_trace_id, batch_size, pool=pool,
+                                         plaintext_generator=plaintext_generator, telemetry=telemetry,
+                                         controller=controller, num_samples=sink.num_samples)
+            else:
+                future = executor.submit(collect_single_trace, current_trace_id, pool=pool,
+                                         plaintext_generator=plaintext_generator, telemetry=telemetry,
+                                         controller=controller, num_samples=sink.num_samples)
+            if telemetry is not None:
+                telemetry.request_started(batch_size)
+                future.add_done_callback(lambda _: telemetry.request_finished(batch_size))
+            futures[future] = current_trace_id
+            current_trace_id += 1
+            total_attempts_made += batch_size
+
+        # Initial population of the worker pool: submit enough tasks to fill the workers
+        while len(futures) < task_limit() and total_attempts_made < max_total_attempts:
+            submit_task()
+
+        # Main loop to manage futures and collect traces
+        while successful_traces_count < n and futures:
+            # Use as_completed to get futures as they complete, allowing dynamic submission
+            for future in as_completed(futures.keys()):
+                original_trace_id = futures.pop(future) # Remove the completed future from active list
+                result = future.result() # Get the result of the completed task
+
+                previous_count = successful_traces_count
+                if isinstance(result, str):
                     # If collection failed (result is an error string), log the failure
                     print(f"[!] Trace request ID {original_trace_id}: {result}")
+                elif batch_size > 1:
+                    # A batch arrives as a plaintext list and one decoded trace matrix
+                    pts, traces, elapsed = result
+                    rejected = sink.add_batch(pts, traces)
+                    if rejected:
+                        _report_length_mismatch(original_trace_id, rejected, sink.num_samples, telemetry)
+                    batch_seconds += elapsed
+                    batch_traces += len(traces)
+                else:
+                    # If successful, append the plaintext and trace
+                    pt, tr = result
+                    if sink.add(pt, tr):
+                        _report_length_mismatch(original_trace_id, 1, sink.num_samples, telemetry)
+                successful_traces_count = sink.count
+                if telemetry is not None:
+                    telemetry.progress(successful_traces_count, n)
+
+                # Provide periodic updates on progress
+                if successful_traces_count // 100 > previous_count // 100:
+                    print(f"[*] Collected {successful_traces_count}/{n} traces successfully...")
+                if successful_traces_count > previous_count and sink.done and successful_traces_count < n:
+                    print(f"[+] Online CPA converged after {sink.count} traces. Stopping trace collection.")
+                    futures.clear() # No further traces needed; drop the remaining requests
+                    break
 
                 # If more successful traces are needed AND we haven't hit the overall attempt limit,
-                # submit a new task to keep the worker pool busy.
+                # submit new tasks to keep the current number of tasks (task_limit) in flight.
                 if successful_traces_count < n and total_attempts_made < max_total_attempts:
-                    new_future = executor.submit(collect_single_trace, current_trace_id)
-                    futures[new_future] = current_trace_id
-                    current_trace_id += 1
-                    total_attempts_made += 1
+                    while len(futures) < task_limit() and total_attempts_made < max_total_attempts:
+                        submit_task()
                 elif successful_traces_count < n and total_attempts_made >= max_total_attempts:
                     # If total attempts maxed out before collecting 'n' traces, stop.
                     print(f"[!] Max total collection attempts ({max_total_attempts}) reached. Stopping trace collection.")
@@ -248,125 +1913,326 @@ def collect_traces_parallel(n=1000, workers=20, max_overall_attempts_factor=5):
 
             # If no more futures are active but we haven't reached 'n' successful traces,
             # it means we're stuck or all possible attempts have been made.
-            if not futures and successful_traces_count < n:
+            if not futures and not sink.done:
                 print(f"[!] All submitted trace requests have completed, but only {successful_traces_count}/{n} traces were collected successfully.")
                 break # Exit the main while loop
 
+    if batch_traces:
+        print(f"[*] Batched acquisition: {batch_traces} traces, amortised latency "
+              f"{batch_seconds / batch_traces * 1000:.2f} ms per trace per session.")
+    if controller is not None:
+        print(f"[*] Adaptive concurrency: ended at {controller.limit} tasks in flight "
+              f"(range {min(l for _, l in controller.history)}-{max(l for _, l in controller.history)}).")
+    pool.print_stats()
+    if attach_telemetry:
+        pool.telemetry = None
+    if own_pool:
+        pool.close()
+    if telemetry is not None:
+        telemetry.progress(sink.count, n)
+        telemetry.finish()
+        telemetry.print_summary()
+
     # Final report on collected traces
-    if len(pts) < n:
-        print(f"[!] Final count: Only {len(pts)}/{n} traces collected. This may affect key recovery accuracy.")
-    return pts, traces
+    if not sink.done:
+        print(f"[!] Final count: Only {sink.count}/{n} traces collected. This may affect key recovery accuracy.")
+    return sink.result()
+
 
+# --- Asyncio Trace Collection ---
+# The threaded collector above ties one OS thread to every in-flight request. The
+# coroutine-based collector below keeps hundreds of requests in flight on a single
+# thread, and shrinks the number of in-flight requests when the server starts timing out.
 
-# --- Lascar Data Getters ---
-# These classes are custom implementations required by lascar's AcquisitionFromGetters.
-# They manage their own internal index to sequentially provide plaintext values and leakage traces.
+ASYNC_READ_LIMIT = 16 * 1024 * 1024
 
-class ValueGetter:
+async def interact_with_server_async(option: bytes, data: bytes, timeout=5.0, telemetry=None) -> bytes:
     """
-    Provides plaintext values to lascar's AcquisitionFromGetters.
+    Asyncio counterpart of interact_with_server: one option/data exchange on a new connection.
     
-    It maintains an internal index to iterate through the list of collected plaintexts.
-    If lascar requests a value beyond the available data, it returns a dummy array
-    to prevent crashes, ensuring lascar's internal processes can complete gracefully.
+    Args:
+        option (bytes): The byte string representing the server option ('1' or '2').
+        data (bytes): The data to send based on the chosen option (plaintext or hex-encoded key).
+        timeout (float): Timeout in seconds for each network step.
+        telemetry (AcquisitionTelemetry): Optional telemetry receiving the 'connect' and 'request' latencies.
+        
+    Returns:
+        bytes: The raw response data received from the server.
+        
+    Raises:
+        asyncio.TimeoutError: If any step of the exchange times out.
+        OSError: On connection errors.
+    """
+    # Raise the StreamReader line limit (64 KiB by default) so long base64 traces fit in one line.
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(HOST, PORT, limit=ASYNC_READ_LIMIT), timeout)
+    if telemetry is not None:
+        connected = time.perf_counter()
+        telemetry.record('connect', connected - start)
+    try:
+        await asyncio.wait_for(reader.read(1024), timeout) # Banner; content is ignored
+        writer.write(option)
+        await writer.drain()
+        await asyncio.wait_for(reader.read(1024), timeout) # Prompt; content is ignored
+        writer.write(data)
+        await writer.drain()
+        # Read up to the delimiter for this option (see RESPONSE_DELIMITERS), or until the
+        # server closes the connection. StreamReader buffers internally, so there is no
+        # per-chunk concatenation and no artificial delay between reads.
+        delimiter = RESPONSE_DELIMITERS.get(option)
+        if delimiter is None:
+            line = await asyncio.wait_for(reader.read(), timeout)
+        else:
+            try:
+                line = await asyncio.wait_for(reader.readuntil(delimiter), timeout)
+                while not line.strip(): # Skip blank lines left over from the prompt
+                    line = await asyncio.wait_for(reader.readuntil(delimiter), timeout)
+            except asyncio.IncompleteReadError as e:
+                line = e.partial # Server closed without a trailing delimiter
+        if telemetry is not None:
+            telemetry.record('request', time.perf_counter() - connected)
+        return line.strip()
+    finally:
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+async def collect_single_trace_async(i, controller, retries=3, timeout=5.0, plaintext_generator=None,
+                                     telemetry=None, num_samples=None):
     """
-    def __init__(self, values):
-        self.values = values
-        self.current_idx = 0 # Initialize internal index for sequential access
-        self.dummy_value_shape = (16,) # Plaintext is always 16 bytes
-        self.dummy_value_dtype = np.uint8
+    Asyncio counterpart of collect_single_trace.
+    
+    Args:
+        i (int): A unique identifier for the trace collection attempt (for logging).
+        controller (ConcurrencyController): Informed of every attempt's outcome and latency.
+        retries (int): The number of times to retry if collection fails.
+        timeout (float): Timeout in seconds for each network step.
+        plaintext_generator (PlaintextGenerator): Source of the plaintexts, as in collect_single_trace.
+        telemetry (AcquisitionTelemetry): Optional telemetry, as in collect_single_trace.
+        num_samples (int): Expected trace length, as in collect_single_trace.
         
-    def get(self):
-        """
-        Returns the next plaintext in the sequence as a NumPy array.
-        """
-        if self.current_idx < len(self.values):
-            val_bytes = self.values[self.current_idx]
-            val_np_array = np.frombuffer(val_bytes, dtype=self.dummy_value_dtype)
-            self.current_idx += 1
-            return val_np_array # Return the actual NumPy array
-        # Fallback: If out of bounds, return a dummy array to prevent AttributeError/IndexError
-        return np.zeros(self.dummy_value_shape, dtype=self.dummy_value_dtype)
+    Returns:
+        tuple: A tuple (plaintext, power_trace_numpy_array) on success.
+               Returns an error string naming the last failure after all retries are exhausted.
+    """
+    generator = plaintext_generator or _default_plaintexts()
+    start = time.perf_counter()
+    last_error = "no attempt made"
+    for attempt in range(retries):
+        if attempt and telemetry is not None:
+            telemetry.count('retries')
+        pt = generator.next(1)[0].tobytes()
+        request_start = time.perf_counter()
+        try:
+            raw = await interact_with_server_async(b'1', pt, timeout=timeout, telemetry=telemetry)
+        except asyncio.TimeoutError:
+            last_error = "timed out"
+            failure = 'timeouts'
+        except OSError as e:
+            last_error = f"connection error: {e}"
+            failure = 'connect_failures'
+        else:
+            decode_start = time.perf_counter()
+            try:
+                trace = b64_decode_trace(raw, num_samples=num_samples)
+                failure = None
+            except ValueError as e:
+                last_error = str(e)
+                failure = 'decode_errors'
+
+        if failure is not None:
+            controller.on_failure()
+            delay = backoff_delay(attempt)
+            if telemetry is not None:
+                telemetry.count(failure)
+                telemetry.record('retry_sleep', delay)
+            await asyncio.sleep(delay)
+            continue
+        controller.on_success(decode_start - request_start)
+        if telemetry is not None:
+            end = time.perf_counter()
+            telemetry.record('decode', end - decode_start)
+            telemetry.record('trace', end - start)
+        return (pt, trace)
 
-class LeakageGetter:
+    if telemetry is not None:
+        telemetry.count('failed_tasks')
+    return f"Failed after {retries} attempts, last error: {last_error}. (Trace ID {i})"
+
+async def collect_traces_async(n=1000, concurrency=16, max_overall_attempts_factor=5,
+                               retries=3, timeout=5.0, min_concurrency=4, store=None, online_cpa=None,
+                               plaintext_generator=None, telemetry=None, max_concurrency=None):
+    """
+    Collects 'n' power traces with up to 'concurrency' requests in flight on one event loop.
+    
+    Same contract as collect_traces_parallel: tasks (each with 'retries' attempts) are
+    submitted until 'n' traces were collected or n * max_overall_attempts_factor tasks
+    were made. The number of tasks in flight adapts to the observed failure rate and
+    latency (ConcurrencyController).
+    
+    Args:
+        n (int): The target number of successful traces to collect.
+        concurrency (int): The initial number of requests in flight.
+        max_overall_attempts_factor (int): Multiplier for 'n' to set the hard limit
+                                           on total collection attempts.
+        retries (int): Attempts per task before it is counted as failed.
+        timeout (float): Timeout in seconds for each network step.
+        min_concurrency (int): Lower bound for the in-flight limit under congestion.
+        store (TraceStore): Optional on-disk store, as in collect_traces_parallel.
+        online_cpa (OnlineCpa): Optional online CPA, as in collect_traces_parallel.
+        plaintext_generator (PlaintextGenerator): Seeded plaintext source, as in collect_traces_parallel.
+        telemetry (AcquisitionTelemetry): Optional telemetry, as in collect_traces_parallel.
+        max_concurrency (int): Upper bound for the in-flight limit (default: 4 * concurrency).
+        
+    Returns:
+        tuple: A tuple (list_of_plaintexts, list_of_traces) containing all successfully collected data.
+               With a store, (plaintexts, traces) are (count, 16) and (count, samples) views of it.
+    """
+    if max_concurrency is None:
+        max_concurrency = 4 * concurrency
+    print(f"[*] Collecting {n} traces with {concurrency} to {max_concurrency} concurrent requests (asyncio)...")
+    plaintext_generator = plaintext_generator or _default_plaintexts()
+    sink = _TraceSink(n, store, online_cpa, plaintext_generator)
+    current_trace_id = 0
+    max_total_attempts = (n - sink.count) * max_overall_attempts_factor
+    controller = ConcurrencyController(concurrency, minimum=min_concurrency, maximum=max_concurrency,
+                                       cooldown=timeout, telemetry=telemetry)
+    in_flight = {} # {task: trace_id}
+    if telemetry is not None:
+        telemetry.start()
+
+    while not sink.done:
+        # Top up the in-flight requests to the current limit, without requesting more
+        # traces than are still missing.
+        while (len(in_flight) < controller.limit and current_trace_id < max_total_attempts
+               and sink.count + len(in_flight) < n):
+            task = asyncio.ensure_future(collect_single_trace_async(
+                current_trace_id, controller, retries=retries, timeout=timeout,
+                plaintext_generator=plaintext_generator, telemetry=telemetry,
+                num_samples=sink.num_samples))
+            if telemetry is not None:
+                telemetry.request_started()
+                task.add_done_callback(lambda _: telemetry.request_finished())
+            in_flight[task] = current_trace_id
+            current_trace_id += 1
+
+        if not in_flight:
+            print(f"[!] Max total collection attempts ({max_total_attempts}) reached. Stopping trace collection.")
+            break
+
+        done, _ = await asyncio.wait(in_flight.keys(), return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            original_trace_id = in_flight.pop(task)
+            result = task.result()
+            if isinstance(result, tuple) and len(result) == 2:
+                pt, tr = result
+                if sink.add(pt, tr):
+                    _report_length_mismatch(original_trace_id, 1, sink.num_samples, telemetry)
+                elif sink.count % 100 == 0:
+                    print(f"[*] Collected {sink.count}/{n} traces successfully...")
+            else:
+                print(f"[!] Trace request ID {original_trace_id}: {result}")
+            if telemetry is not None:
+                telemetry.progress(sink.count, n)
+
+    if online_cpa is not None and online_cpa.converged and sink.count < n:
+        print(f"[+] Online CPA converged after {sink.count} traces. Stopping trace collection.")
+    if in_flight:
+        # Target reached while the last requests were still running; they are not needed.
+        for task in in_flight:
+            task.cancel()
+        await asyncio.gather(*in_flight, return_exceptions=True)
+    print(f"[*] Adaptive concurrency: ended at {controller.limit} requests in flight "
+          f"(range {min(l for _, l in controller.history)}-{max(l for _, l in controller.history)}).")
+    if telemetry is not None:
+        telemetry.finish()
+        telemetry.print_summary()
+
+    if not sink.done:
+        print(f"[!] Final count: Only {sink.count}/{n} traces collected. This may affect key recovery accuracy.")
+    return sink.result()
+
+def collect_traces_asyncio(n=1000, concurrency=16, max_overall_attempts_factor=5, **kwargs):
     """
-    Provides leakage traces to lascar's AcquisitionFromGetters.
+    Synchronous entry point running collect_traces_async on a new event loop.
     
-    It maintains an internal index to iterate through the list of collected traces.
-    If lascar requests a trace beyond the available data, it returns a dummy array
-    to prevent crashes, ensuring lascar's internal processes can complete gracefully.
+    Returns:
+        tuple: A tuple (list_of_plaintexts, list_of_traces), as collect_traces_parallel.
     """
-    def __init__(self, traces, dummy_trace_shape, dummy_trace_dtype):
-        self.traces = traces
-        self.current_idx = 0 # Initialize internal index for sequential access
-        self.dummy_trace_shape = dummy_trace_shape # Shape of a single trace (e.g., (1042,))
-        self.dummy_trace_dtype = dummy_trace_dtype # Data type of trace samples (e.g., float64)
+    return asyncio.run(collect_traces_async(n=n, concurrency=concurrency,
+                                            max_overall_attempts_factor=max_overall_attempts_factor,
+                                            **kwargs))
+
+
+# --- Lascar Trace Container ---
+# lascar's TraceBatchContainer gives random access to the (n, samples) trace matrix and the
+# (n, 16) plaintext matrix, and hands the engines contiguous batches sliced straight out of them.
+# One container and one Session therefore serve all 16 key bytes: no per-trace get() calls,
+# no per-byte re-acquisition and no zero-padding past the last trace.
+
+def lascar_container(plaintexts, traces):
+    """
+    Wraps collected data in a lascar TraceBatchContainer.
+    
+    Args:
+        plaintexts: A list of plaintexts (bytes or NumPy arrays), or a (n, 16) uint8 matrix
+                    such as the zero-copy view returned by a TraceStore.
+        traces: A list of power traces, or a (n, samples) matrix.
         
-    def get(self):
-        """
-        Returns the next leakage trace in the sequence as a NumPy array.
-        """
-        if self.current_idx < len(self.traces):
-            trace = self.traces[self.current_idx]
-            self.current_idx += 1
-            return trace # Return the actual NumPy array
-        # Fallback: If out of bounds, return a dummy array to prevent AttributeError/IndexError
-        return np.zeros(self.dummy_trace_shape, dtype=self.dummy_trace_dtype)
+    Returns:
+        TraceBatchContainer: Container with the traces as leakages and the plaintexts as values.
+                             Matrices are used as they are; lists are stacked once.
+    """
+    from lascar.container import TraceBatchContainer # Optional dependency, only needed here
+
+    values = plaintext_matrix(plaintexts)
+    leakages = traces if isinstance(traces, np.ndarray) else np.asarray(traces)
+    return TraceBatchContainer(leakages, values)
 
 # --- Lascar CPA Session Execution ---
-def run_lascar_session(plaintexts, traces):
+def lascar_cpa_scores(plaintexts, traces, batch_size=1000):
     """
-    Executes the Correlation Power Analysis (CPA) using the collected data.
+    Executes the Correlation Power Analysis (CPA) using the collected data and keeps the full score table.
     
-    This function sets up the lascar acquisition, defines the power model,
-    configures the CPA engine, and runs the attack for each byte of the AES key.
+    This function wraps the data in an array-backed lascar container, defines the power model,
+    and runs one CPA engine per AES key byte in a single lascar session.
     
     Args:
-        plaintexts (list): A list of NumPy arrays, where each array is a plaintext.
-        traces (list): A list of NumPy arrays, where each array is a power trace.
+        plaintexts (list): A list of plaintexts (bytes or NumPy arrays), or a (n, 16) uint8 matrix
+                           such as the zero-copy view returned by a TraceStore.
+        traces (list): A list of NumPy arrays, where each array is a power trace, or a (n, samples) matrix.
+        batch_size (int): Number of traces lascar passes to the engines at once.
         
     Returns:
-        bytes: The recovered AES key (16 bytes). Returns None if CPA fails.
+        numpy.ndarray: (16, 256) score table (peak absolute correlation per key byte and guess).
+                       Returns None if CPA fails.
+                       
+    Raises:
+        ImportError: If lascar is not installed (run_numpy_cpa needs no lascar).
     """
+    from lascar import CpaEngine, Session # Optional dependency, only needed here
+
     # Basic validation: ensure data is available and consistent
-    if not plaintexts or not traces or len(plaintexts) != len(traces):
+    if len(plaintexts) == 0 or len(traces) == 0 or len(plaintexts) != len(traces):
         print("[!] No valid plaintexts or traces available for CPA. Aborting.")
         return None
-    
-    # Determine the shape and data type of a single power trace.
-    # This is crucial for lascar's internal setup (e.g., allocating memory for correlation arrays).
-    # We loop to find the first non-empty trace to get accurate shape information.
-    first_trace_shape = None
-    first_trace_dtype = None
-    for tr in traces:
-        if tr is not None and tr.size > 0:
-            first_trace_shape = tr.shape
-            first_trace_dtype = tr.dtype
-            break
 
-    if first_trace_shape is None:
+    try:
+        container = lascar_container(plaintexts, traces)
+    except ValueError as e:
+        # Traces of different lengths cannot be stacked into one matrix.
+        print(f"[!] Traces cannot be arranged into a trace matrix ({e}). Aborting CPA.")
+        return None
+    if container.leakages.ndim != 2 or container.leakages.shape[1] == 0:
         print("[!] No valid non-empty traces collected to determine samples_shape/dtype. Aborting CPA.")
         return None
 
-    key_guess = []
-    print("[*] Starting CPA analysis for each key byte...")
-    
-    # Iterate through each of the 16 bytes of the AES key
+    print("[*] Starting CPA analysis for all key bytes...")
+    engines = []
     for byte in range(16):
-        # Create FRESH instances of ValueGetter and LeakageGetter for EACH byte.
-        # This is a crucial workaround for potential internal state management issues
-        # or early consumption of getter values by lascar's AcquisitionFromGetters
-        # during its initialization for each new CPA engine/session for a byte.
-        # It ensures that each byte's CPA analysis starts with a fresh data stream.
-        acquisition = AcquisitionFromGetters(
-            number_of_traces=len(traces),              # Total number of traces available
-            value_getter=ValueGetter(plaintexts),      # Instance to get plaintexts
-            leakage_getter=LeakageGetter(traces, first_trace_shape, first_trace_dtype), # Instance to get traces, with shape/dtype for dummy arrays
-            # Removed samples_shape and samples_dtype directly from AcquisitionFromGetters
-            # This allows lascar to infer them from the first samples provided by the getters,
-            # or from the `leakage_getter`'s internal dummy shape if needed.
-        )
-
         def selection_func(value, guess, b=byte):
             """
             Defines the power model (hypothesized leakage for a given key guess).
@@ -376,7 +2242,7 @@ def run_lascar_session(plaintexts, traces):
             of the CPA attack, linking power consumption to cryptographic operations.
             
             Args:
-                value (numpy.ndarray): The current plaintext as a NumPy array (from ValueGetter).
+                value (numpy.ndarray): The current plaintext as a NumPy array (a row of the container's values).
                 guess (int): The current key byte guess (0-255).
                 b (int): The index of the current byte being attacked (0-15).
                 
@@ -384,67 +2250,988 @@ def run_lascar_session(plaintexts, traces):
                 int: The Hamming Weight, representing the expected power leakage.
             """
             # value[b] accesses the specific byte of the plaintext.
-            # sbox[plaintext_byte ^ guess] applies the S-box transformation.
+            # SBOX[plaintext_byte ^ guess] applies the S-box transformation.
             # HW[...] then gets the Hamming Weight of that result.
-            return HW[sbox[value[b] ^ guess]]
+            return HW[SBOX[value[b] ^ guess]]
 
-        # Initialize the CPA engine for the current byte.
-        # The 'selection_function' defines the power model, and 'guess_range' specifies
-        # the possible values for the key byte (0-255).
+        # One CPA engine per key byte. The 'selection_function' defines the power model, and
+        # 'guess_range' specifies the possible values for the key byte (0-255).
         # `jit=True` enables Numba JIT compilation for performance.
-        engine = CpaEngine(
-            name=f"cpa_byte_{byte}", 
-            selection_function=selection_func, 
+        engines.append(CpaEngine(
+            name=f"cpa_byte_{byte}",
+            selection_function=selection_func,
             guess_range=range(256),
-            jit=True 
-        )
-        
-        # Create a lascar session to run the CPA attack for this byte.
-        # It links the acquisition data with the CPA engine.
-        session = Session(acquisition, engines=[engine])
-        
-        # Run the CPA attack. Batches process traces in chunks to manage memory.
-        session.run(batch_size=100) 
+            jit=True
+        ))
 
-        # Finalize the engine to get the correlation results (e.g., Pearson correlation coefficients).
-        results = engine.finalize()
+    # A single session runs all 16 engines over the same container, so every batch of traces
+    # is read once and shared by all key bytes.
+    session = Session(container, engines=engines)
+    session.run(batch_size=batch_size)
 
+    # Finalize each engine to get the correlation results (guesses x samples Pearson coefficients)
+    # and keep the peak absolute correlation of every guess.
+    return np.stack([np.max(np.abs(engine.finalize()), axis=1) for engine in engines])
+
+def run_lascar_session(plaintexts, traces, batch_size=1000):
+    """
+    Runs the lascar CPA (lascar_cpa_scores) and returns the best guess for every key byte.
+    
+    Args:
+        plaintexts (list): A list of plaintexts, or a (n, 16) uint8 matrix.
+        traces (list): A list of power traces, or a (n, samples) matrix.
+        batch_size (int): Number of traces lascar passes to the engines at once.
+        
+    Returns:
+        bytes: The recovered AES key (16 bytes). Returns None if CPA fails.
+    """
+    scores = lascar_cpa_scores(plaintexts, traces, batch_size=batch_size)
+    if scores is None:
+        return None
+    key_guess = []
+    for byte in range(16):
         # Find the best guess: The key byte guess that yields the maximum absolute correlation.
         # The peak in correlation typically indicates the correct key byte.
-        best_guess = np.argmax(np.max(np.abs(results), axis=1))
+        best_guess = int(np.argmax(scores[byte]))
         print(f"[Byte {byte:02d}] Best Guess: {hex(best_guess)}")
         key_guess.append(best_guess) # Add the best guess for this byte to the overall key
     
     return bytes(key_guess) # Return the full recovered key
 
+# --- NumPy CPA Engine ---
+# The lascar path streams every trace 16 times (one Session per key byte) and calls the Python
+# selection function for every (trace, guess) pair. The engine below makes a single pass.
+# The hypothesis for a key byte depends only on the matching plaintext byte, so traces are
+# summed per plaintext byte value (16 x 256 class sums, one one-hot matrix product per batch).
+# The Pearson sums of the full 16 x 256 hypothesis matrix HW[SBOX[pt[:, b] ^ k]] then follow
+# from the class sums with one 256 x 256 matrix product per byte.
+
+# HYPOTHESES[guess, pt_byte] = HW[SBOX[pt_byte ^ guess]]: the power model for every key guess
+# and plaintext byte value.
+_BYTE_VALUES = np.arange(256, dtype=np.uint8)
+HYPOTHESES = HW[SBOX[_BYTE_VALUES[:, None] ^ _BYTE_VALUES[None, :]]].astype(np.float64)
+
+def plaintext_matrix(plaintexts):
+    """
+    Converts plaintexts to a (n, 16) uint8 matrix.
+    
+    Args:
+        plaintexts: A list of 16-byte plaintexts (bytes or NumPy arrays), or a (n, 16) matrix.
+        
+    Returns:
+        numpy.ndarray: The (n, 16) uint8 plaintext matrix (the input itself if it already is one).
+    """
+    if isinstance(plaintexts, np.ndarray):
+        return plaintexts.astype(np.uint8, copy=False).reshape(-1, 16)
+    return np.frombuffer(b''.join(bytes(pt) for pt in plaintexts), dtype=np.uint8).reshape(-1, 16)
+
+class CpaAccumulator:
+    """
+    Accumulates first-round AES CPA statistics for all 16 key bytes and 256 guesses at once.
+    
+    Keeps Σx and Σx² per sample plus, per key byte, the trace count and trace sum for every
+    plaintext byte value. Memory is 16 * 256 * num_samples float64 values, independent of
+    the number of traces.
+    """
+    def __init__(self, num_samples):
+        self.num_samples = num_samples
+        self.n = 0
+        self.offset = None # Mean of the first batch, subtracted from all traces for numerical stability
+        self.sum_x = np.zeros(num_samples)
+        self.sum_x2 = np.zeros(num_samples)
+        self.class_counts = np.zeros((16, 256))
+        self.class_sums = np.zeros((16 * 256, num_samples))
+
+    def update(self, plaintexts, traces):
+        """
+        Adds a batch of traces.
+        
+        Args:
+            plaintexts: (m, 16) plaintext matrix or list of plaintexts.
+            traces: (m, num_samples) trace matrix or list of traces.
+        """
+        pts = plaintext_matrix(plaintexts)
+        x = np.asarray(traces, dtype=np.float64)
+        if len(x) == 0:
+            return
+        if self.offset is None:
+            self.offset = x.mean(axis=0)
+        x = x - self.offset
+        m = len(x)
+        self.n += m
+        self.sum_x += x.sum(axis=0)
+        self.sum_x2 += np.einsum('ij,ij->j', x, x)
+
+        # One-hot encoding of each plaintext byte value: column b * 256 + v is 1 where pt[b] == v.
+        one_hot = np.zeros((m, 16 * 256))
+        one_hot[np.arange(m)[:, None], np.arange(16) * 256 + pts] = 1.0
+        self.class_counts += one_hot.sum(axis=0).reshape(16, 256)
+        self.class_sums += one_hot.T @ x
+
+    def correlations(self):
+        """
+        Computes the Pearson correlation of every hypothesis with every sample.
+        
+        Returns:
+            numpy.ndarray: (16, 256, num_samples) correlations, indexed [key_byte, guess, sample].
+                           Entries with zero variance are 0.
+        """
+        n = self.n
+        mean_x = self.sum_x / n
+        var_x = self.sum_x2 / n - mean_x ** 2
+        # Σh and Σh² of each guess follow from how often each plaintext byte value occurred.
+        sum_h = self.class_counts @ HYPOTHESES.T
+        sum_h2 = self.class_counts @ (HYPOTHESES ** 2).T
+        # Σh·x for each guess: hypothesis-weighted sum of the per-value trace sums.
+        sum_hx = np.matmul(HYPOTHESES, self.class_sums.reshape(16, 256, self.num_samples))
+        mean_h = sum_h / n
+        var_h = sum_h2 / n - mean_h ** 2
+        cov = sum_hx / n - mean_h[:, :, None] * mean_x[None, None, :]
+        denom = np.sqrt(np.clip(var_h[:, :, None] * var_x[None, None, :], 0.0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(denom > 0, cov / denom, 0.0)
+
+    def scores(self):
+        """
+        Returns:
+            numpy.ndarray: (16, 256) peak absolute correlation of every guess, as used by lascar's
+                           best-guess selection (max over samples of |correlation|).
+        """
+        return np.max(np.abs(self.correlations()), axis=2)
+
+    def best_key(self):
+        """
+        Returns:
+            bytes: The best guess (highest peak absolute correlation) for each of the 16 key bytes.
+        """
+        return bytes(np.argmax(self.scores(), axis=1).astype(np.uint8))
+
+class OnlineCpa:
+    """
+    Incremental CPA fed with traces while they are being collected.
+    
+    Traces are buffered and added to a CpaAccumulator every 'update_every' traces. After each
+    update the current best guess and its margin to the second-best guess are recorded for each
+    key byte. The attack has converged once the ranking of every byte (its top 'ranking_depth'
+    guesses) has stayed unchanged for 'stable_traces' traces.
+    """
+    def __init__(self, stable_traces=300, update_every=100, min_traces=200, ranking_depth=1, aligner=None):
+        """
+        Args:
+            stable_traces (int): Number of traces every byte's ranking must stay unchanged for.
+            update_every (int): Number of traces between accumulator updates / convergence checks.
+            min_traces (int): Minimum number of traces before convergence can be declared.
+            ranking_depth (int): Number of top guesses per byte whose order must be stable.
+            aligner (TraceAligner): Optional aligner applied to every chunk of traces before it
+                                    is added, for targets with jitter.
+        """
+        self.aligner = aligner
+        self.stable_traces = stable_traces
+        self.update_every = update_every
+        self.min_traces = min_traces
+        self.ranking_depth = ranking_depth
+        self.accumulator = None
+        self._pending_pts = []
+        self._pending_traces = []
+        self._rankings = None # (16, ranking_depth) top guesses at the last check
+        self._stable_since = np.zeros(16, dtype=np.int64) # Trace count at which each ranking last changed
+        self.best_guesses = None # (16,) current best guess per byte
+        self.margins = None # (16,) best score minus second-best score per byte
+
+    @property
+    def n(self):
+        return 0 if self.accumulator is None else self.accumulator.n
+
+    def add(self, pt, trace):
+        """
+        Adds one collected (plaintext, trace) pair; triggers an update every 'update_every' pairs.
+        """
+        self._pending_pts.append(pt)
+        self._pending_traces.append(trace)
+        if len(self._pending_traces) >= self.update_every:
+            self.flush()
+
+    def update(self, plaintexts, traces, batch_size=1000):
+        """
+        Adds a batch of traces at once (e.g., traces already in a TraceStore) and re-evaluates.
+        
+        The traces are aligned and accumulated 'batch_size' rows at a time, so replaying a large
+        memory-mapped store only ever holds one batch in memory as float64.
+        """
+        self.flush()
+        if len(traces) == 0:
+            return
+        if self.accumulator is None:
+            self.accumulator = CpaAccumulator(np.asarray(traces[0]).shape[0])
+        for start in range(0, len(traces), batch_size):
+            chunk = traces[start:start + batch_size]
+            if self.aligner is not None:
+                chunk = self.aligner.align(chunk)
+            self.accumulator.update(plaintexts[start:start + batch_size], chunk)
+        self._evaluate()
+
+    def flush(self):
+        """
+        Adds the buffered traces to the accumulator and re-evaluates the rankings.
+        """
+        if not self._pending_traces:
+            return
+        pts, traces = self._pending_pts, self._pending_traces
+        self._pending_pts, self._pending_traces = [], []
+        self.update(pts, traces)
+
+    def _evaluate(self):
+        scores = self.accumulator.scores()
+        order = np.argsort(-scores, axis=1)
+        rankings = order[:, :self.ranking_depth]
+        rows = np.arange(16)
+        self.best_guesses = order[:, 0]
+        self.margins = scores[rows, order[:, 0]] - scores[rows, order[:, 1]]
+        if self._rankings is None:
+            self._stable_since[:] = self.n
+        else:
+            changed = np.any(rankings != self._rankings, axis=1)
+            self._stable_since[changed] = self.n
+        self._rankings = rankings
+        print(f"[*] Online CPA @ {self.n} traces: {int(np.sum(self.n - self._stable_since >= self.stable_traces))}/16 "
+              f"bytes stable, smallest margin {self.margins.min():.4f}.")
+
+    @property
+    def converged(self):
+        """
+        True once every byte's ranking has been stable for 'stable_traces' traces.
+        """
+        return (self._rankings is not None and self.n >= self.min_traces
+                and bool(np.all(self.n - self._stable_since >= self.stable_traces)))
+
+    def best_key(self):
+        """
+        Returns:
+            bytes: The current best guess for each key byte (after adding buffered traces).
+        """
+        self.flush()
+        return None if self.best_guesses is None else bytes(self.best_guesses.astype(np.uint8))
+
+    def report(self):
+        """
+        Prints the current best guess and margin to the second-best guess for every key byte.
+        """
+        self.flush()
+        if self.best_guesses is None:
+            print("[!] Online CPA has no traces yet.")
+            return
+        for byte in range(16):
+            print(f"[Byte {byte:02d}] Best Guess: {hex(self.best_guesses[byte])} "
+                  f"(margin {self.margins[byte]:.4f}, stable for {self.n - self._stable_since[byte]} traces)")
+
+def run_numpy_cpa(plaintexts, traces, batch_size=1000):
+    """
+    Runs the CPA for all 16 key bytes in one pass over the traces with CpaAccumulator.
+    
+    Produces the same best guesses as run_lascar_session (same Hamming-weight power model
+    and max-|correlation| selection) without lascar's per-byte sessions.
+    
+    Args:
+        plaintexts: A list of plaintexts or a (n, 16) uint8 matrix.
+        traces: A list of NumPy arrays or a (n, samples) matrix (e.g., a TraceStore memmap view).
+        batch_size (int): Number of traces processed per batch (bounds temporary memory).
+        
+    Returns:
+        bytes: The recovered AES key (16 bytes). Returns None if CPA fails.
+    """
+    if len(plaintexts) == 0 or len(traces) == 0 or len(plaintexts) != len(traces):
+        print("[!] No valid plaintexts or traces available for CPA. Aborting.")
+        return None
+
+    print("[*] Starting single-pass CPA analysis for all key bytes...")
+    accumulator = CpaAccumulator(np.asarray(traces[0]).shape[0])
+    for start in range(0, len(traces), batch_size):
+        accumulator.update(plaintexts[start:start + batch_size], traces[start:start + batch_size])
+
+    key = accumulator.best_key()
+    for byte, guess in enumerate(key):
+        print(f"[Byte {byte:02d}] Best Guess: {hex(guess)}")
+    return key
+
+# --- Trace Alignment ---
+# CPA assumes the leaking operation happens at the same sample in every trace. When the target
+# adds jitter, the aligner below estimates each trace's offset from a reference trace by FFT
+# cross-correlation (a whole chunk of traces per FFT call) and shifts it back. The reference is
+# fixed once chosen, so chunks can be aligned independently as the collector delivers them.
+
+class TraceAligner:
+    """
+    Aligns traces to a reference trace by FFT-based cross-correlation.
+    """
+    def __init__(self, reference=None, max_shift=None, window=None):
+        """
+        Args:
+            reference (numpy.ndarray): Reference trace. If None, the first trace aligned is used.
+            max_shift (int): Largest shift (in samples, either direction) considered.
+                             Defaults to a quarter of the trace length.
+            window (tuple): Optional (start, stop) sample range of a distinctive feature to align
+                            on. Only this range is cross-correlated; whole traces are shifted.
+        """
+        self.max_shift = max_shift
+        self.window = window
+        self.reference = None
+        self._ref_fft = None
+        self._nfft = None
+        self.shifts = np.empty(0, dtype=np.int64) # Shifts applied to the most recent chunk
+        if reference is not None:
+            self.set_reference(reference)
+
+    def _segment(self, x):
+        if self.window is not None:
+            x = x[..., self.window[0]:self.window[1]]
+        return x - x.mean(axis=-1, keepdims=True)
+
+    def set_reference(self, reference):
+        """
+        Sets the reference trace and precomputes its spectrum.
+        """
+        self.reference = np.asarray(reference, dtype=np.float64)
+        segment = self._segment(self.reference)
+        length = segment.shape[0]
+        if self.max_shift is None:
+            self.max_shift = self.reference.shape[0] // 4
+        # Zero-pad so that shifts up to max_shift do not wrap around (linear, not circular, correlation).
+        self._nfft = 1 << int(np.ceil(np.log2(length + self.max_shift)))
+        self._ref_fft = np.conj(np.fft.rfft(segment, n=self._nfft))
+
+    def estimate_shifts(self, traces):
+        """
+        Estimates how many samples each trace lags behind the reference.
+        
+        Args:
+            traces: (m, samples) matrix or list of traces.
+            
+        Returns:
+            numpy.ndarray: (m,) int64 shifts; positive means the trace is delayed.
+        """
+        x = np.asarray(traces, dtype=np.float64)
+        if self._ref_fft is None:
+            self.set_reference(x[0])
+        spectrum = np.fft.rfft(self._segment(x), n=self._nfft, axis=1)
+        xcorr = np.fft.irfft(spectrum * self._ref_fft, n=self._nfft, axis=1)
+        # Lag k sits at index k for k >= 0 and at nfft + k for k < 0.
+        lags = np.arange(-self.max_shift, self.max_shift + 1)
+        candidates = xcorr[:, lags % self._nfft]
+        return lags[np.argmax(candidates, axis=1)]
+
+    def align(self, traces):
+        """
+        Shifts every trace onto the reference. Samples shifted in from beyond the trace
+        edges repeat the edge value.
+        
+        Args:
+            traces: (m, samples) matrix or list of traces.
+            
+        Returns:
+            numpy.ndarray: (m, samples) aligned traces. The applied shifts are in self.shifts.
+        """
+        x = np.asarray(traces, dtype=np.float64)
+        if len(x) == 0:
+            return x
+        self.shifts = self.estimate_shifts(x)
+        num_samples = x.shape[1]
+        idx = np.clip(np.arange(num_samples)[None, :] + self.shifts[:, None], 0, num_samples - 1)
+        return np.take_along_axis(x, idx, axis=1)
+
+def align_traces(traces, reference=None, max_shift=None, window=None, batch_size=1000):
+    """
+    Aligns a whole trace set in chunks with one TraceAligner.
+    
+    Args:
+        traces: A list of NumPy arrays or a (n, samples) matrix.
+        reference, max_shift, window: See TraceAligner.
+        batch_size (int): Number of traces aligned per FFT batch.
+        
+    Returns:
+        tuple: ((n, samples) aligned traces, (n,) applied shifts).
+    """
+    aligner = TraceAligner(reference=reference, max_shift=max_shift, window=window)
+    aligned = []
+    shifts = []
+    for b0 in range(0, len(traces), batch_size):
+        aligned.append(aligner.align(traces[b0:b0 + batch_size]))
+        shifts.append(aligner.shifts)
+    return np.concatenate(aligned), np.concatenate(shifts)
+
+# --- Trace Preprocessing ---
+# Most samples of a decoded trace carry no leakage, yet the CPA correlates all of them in float64.
+# The preprocessor below optionally crops and decimates the traces, keeps only points of interest
+# (POIs) ranked by SNR or SOST, and stores them as float32 or int16. The key is never needed: with
+# a fixed key, the first-round S-box output is determined by the plaintext byte, so traces grouped
+# by plaintext byte value separate exactly like traces grouped by the leaking intermediate.
+
+class TracePreprocessor:
+    """
+    Reduces traces before CPA: windowing, decimation, POI selection and quantisation.
+    
+    fit() makes one batched pass to rank samples; transform() then reduces any traces
+    (including traces collected later) the same way.
+    """
+    def __init__(self, window=None, decimate=1, method='snr', pois_per_byte=10, dtype='float32', batch_size=1000):
+        """
+        Args:
+            window (tuple): Optional (start, stop) sample range to keep before anything else.
+            decimate (int): Average every 'decimate' consecutive samples into one.
+            method (str): POI ranking: 'snr' (between-class / within-class variance) or
+                          'sost' (sum of squared pairwise t-differences).
+            pois_per_byte (int): Number of top-ranked samples kept per key byte (the union over
+                                 all 16 bytes is kept). None keeps every sample.
+            dtype (str): Output sample type: 'float64', 'float32' or 'int16'. int16 scales each kept
+                         sample to the full int16 range, which does not change Pearson correlations
+                         beyond rounding. The range is that of the traces seen by fit(); samples
+                         outside it are saturated at +/-32767 by transform().
+            batch_size (int): Number of traces processed per batch.
+        """
+        if method not in ('snr', 'sost'):
+            raise ValueError(f"Unknown POI ranking method: {method}")
+        if dtype not in ('float64', 'float32', 'int16'):
+            raise ValueError(f"Unsupported output dtype: {dtype}")
+        self.window = window
+        self.decimate = decimate
+        self.method = method
+        self.pois_per_byte = pois_per_byte
+        self.dtype = np.dtype(dtype)
+        self.batch_size = batch_size
+        self.leakage = None # (16, reduced_samples) ranking score per key byte and sample
+        self.sample_indices = None # Kept samples, as indices into the windowed/decimated trace
+        self._scale = None # int16 quantisation: x_q = (x - offset) * scale - 32767
+        self._offset = None
+        self.input_bytes = 0
+        self.output_bytes = 0
+
+    def _reduce(self, x):
+        """
+        Applies windowing and decimation to a (m, samples) batch.
+        """
+        x = np.asarray(x, dtype=np.float64)
+        if self.window is not None:
+            x = x[:, self.window[0]:self.window[1]]
+        if self.decimate > 1:
+            usable = (x.shape[1] // self.decimate) * self.decimate
+            x = x[:, :usable].reshape(len(x), -1, self.decimate).mean(axis=2)
+        return x
+
+    def fit(self, plaintexts, traces):
+        """
+        Ranks the (windowed, decimated) samples and selects the POIs.
+        
+        Args:
+            plaintexts: A list of plaintexts or a (n, 16) uint8 matrix.
+            traces: A list of NumPy arrays or a (n, samples) matrix.
+            
+        Returns:
+            TracePreprocessor: self.
+        """
+        pts = plaintext_matrix(plaintexts)
+        counts = sums = squares = None
+        low = high = None
+        for b0 in range(0, len(pts), self.batch_size):
+            x = self._reduce(traces[b0:b0 + self.batch_size])
+            p = pts[b0:b0 + self.batch_size]
+            if sums is None:
+                counts = np.zeros(16 * 256)
+                sums = np.zeros((16 * 256, x.shape[1]))
+                squares = np.zeros((16 * 256, x.shape[1]))
+                low, high = x.min(axis=0), x.max(axis=0)
+            one_hot = np.zeros((len(x), 16 * 256))
+            one_hot[np.arange(len(x))[:, None], np.arange(16) * 256 + p] = 1.0
+            counts += one_hot.sum(axis=0)
+            sums += one_hot.T @ x
+            squares += one_hot.T @ (x * x)
+            low, high = np.minimum(low, x.min(axis=0)), np.maximum(high, x.max(axis=0))
+
+        num_samples = sums.shape[1]
+        counts = counts.reshape(16, 256, 1)
+        sums = sums.reshape(16, 256, num_samples)
+        squares = squares.reshape(16, 256, num_samples)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(counts > 0, sums / counts, 0.0)
+            variances = np.where(counts > 1, squares / counts - means ** 2, 0.0)
+        self.leakage = self._snr(counts, means, variances) if self.method == 'snr' \
+            else self._sost(counts, means, variances)
+
+        if self.pois_per_byte is None or self.pois_per_byte >= num_samples:
+            self.sample_indices = np.arange(num_samples)
+        else:
+            top = np.argsort(-self.leakage, axis=1)[:, :self.pois_per_byte]
+            self.sample_indices = np.unique(top)
+
+        if self.dtype == np.int16:
+            span = (high - low)[self.sample_indices]
+            self._offset = low[self.sample_indices]
+            self._scale = np.where(span > 0, 65534.0 / np.where(span > 0, span, 1.0), 0.0)
+        return self
+
+    @staticmethod
+    def _snr(counts, means, variances):
+        """
+        Between-class variance of the class means over the mean within-class variance.
+        """
+        n = counts.sum(axis=1) # (16, 1)
+        grand_mean = (counts * means).sum(axis=1) / n
+        signal = (counts * (means - grand_mean[:, None, :]) ** 2).sum(axis=1) / n
+        noise = (counts * variances).sum(axis=1) / n
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(noise > 0, signal / noise, 0.0)
+
+    @staticmethod
+    def _sost(counts, means, variances, chunk=64):
+        """
+        Sum over all pairs of populated classes of the squared difference of their means,
+        normalised by the sum of the squared standard errors.
+        
+        Pairs are formed by broadcasting every class against the class 'k' values further
+        on, for all 16 bytes at once, so only the 255 offsets are iterated over. Samples are
+        processed 'chunk' at a time to keep the pairwise arrays in cache.
+        """
+        num_samples = means.shape[2]
+        sost = np.zeros((16, num_samples))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # An infinite standard error makes every pair with an unusable class contribute 0
+            std_err2 = np.where(counts > 1, variances / counts, np.inf)
+        for s0 in range(0, num_samples, chunk):
+            m = np.ascontiguousarray(means[:, :, s0:s0 + chunk])
+            e = np.ascontiguousarray(std_err2[:, :, s0:s0 + chunk])
+            out = sost[:, s0:s0 + chunk]
+            for k in range(1, 256):
+                terms = m[:, :-k] - m[:, k:]
+                terms *= terms
+                denom = e[:, :-k] + e[:, k:]
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    terms /= denom
+                terms[denom <= 0] = 0.0
+                out += terms.sum(axis=1)
+        return sost
+
+    def transform(self, traces):
+        """
+        Reduces traces to the selected POIs in the output dtype.
+        
+        With int16 output, samples outside the range seen by fit() are saturated at +/-32767
+        instead of wrapping around.
+        
+        Args:
+            traces: A list of NumPy arrays or a (n, samples) matrix.
+            
+        Returns:
+            numpy.ndarray: (n, num_pois) reduced trace matrix.
+        """
+        if self.sample_indices is None:
+            raise ValueError("TracePreprocessor.transform() called before fit().")
+        out = np.empty((len(traces), len(self.sample_indices)), dtype=self.dtype)
+        for b0 in range(0, len(traces), self.batch_size):
+            x = self._reduce(traces[b0:b0 + self.batch_size])[:, self.sample_indices]
+            if self.dtype == np.int16:
+                x = np.clip(np.rint((x - self._offset) * self._scale - 32767.0), -32767.0, 32767.0)
+            out[b0:b0 + len(x)] = x
+        self.input_bytes += traces.nbytes if isinstance(traces, np.ndarray) \
+            else sum(np.asarray(tr).nbytes for tr in traces)
+        self.output_bytes += out.nbytes
+        return out
+
+    def fit_transform(self, plaintexts, traces):
+        return self.fit(plaintexts, traces).transform(traces)
+
+    def report(self):
+        """
+        Prints the number of kept samples and the data reduction achieved so far.
+        """
+        ratio = self.input_bytes / self.output_bytes if self.output_bytes else float('nan')
+        print(f"[*] Preprocessing kept {len(self.sample_indices)} samples ({self.method.upper()} POIs, "
+              f"{self.dtype.name}): {self.input_bytes / 1e6:.2f} MB -> {self.output_bytes / 1e6:.2f} MB "
+              f"({ratio:.1f}x smaller).")
+
+def preprocess_traces(plaintexts, traces, verify=False, **kwargs):
+    """
+    Fits a TracePreprocessor on the traces, reduces them and reports the reduction.
+    
+    Args:
+        plaintexts: A list of plaintexts or a (n, 16) uint8 matrix.
+        traces: A list of NumPy arrays or a (n, samples) matrix.
+        verify (bool): Also run the CPA on the full and the reduced traces and report whether
+                       the recovered key is unchanged (costs one full-size CPA).
+        **kwargs: Options passed to TracePreprocessor.
+        
+    Returns:
+        tuple: (reduced_traces, preprocessor).
+    """
+    preprocessor = TracePreprocessor(**kwargs)
+    reduced = preprocessor.fit_transform(plaintexts, traces)
+    preprocessor.report()
+    if verify:
+        full_key = _cpa_key(plaintexts, traces)
+        reduced_key = _cpa_key(plaintexts, reduced)
+        if full_key == reduced_key:
+            print(f"[+] Recovered key unchanged after preprocessing: {reduced_key.hex()}")
+        else:
+            print(f"[!] Preprocessing changed the recovered key: {full_key.hex()} -> {reduced_key.hex()}")
+    return reduced, preprocessor
+
+def _cpa_key(plaintexts, traces, batch_size=1000):
+    """
+    Best key of a single-pass CPA, without run_numpy_cpa's per-byte output.
+    """
+    accumulator = CpaAccumulator(np.asarray(traces[0]).shape[0])
+    for b0 in range(0, len(traces), batch_size):
+        accumulator.update(plaintexts[b0:b0 + batch_size], traces[b0:b0 + batch_size])
+    return accumulator.best_key()
+
+# --- Multi-Core CPA ---
+# Correlations of different samples are independent, so the trace matrix is cut into fixed-size
+# sample windows that a process pool works on in parallel. The plaintext and trace matrices are
+# copied once into shared memory and every worker maps them directly instead of receiving a
+# pickled copy. The windows do not depend on the number of workers, and each window is computed
+# by the same code in the same order whether it runs in a worker or in-process (workers=1), so the
+# score table and recovered key are identical for any 'workers' value.
+
+def _cpa_window_worker(task):
+    """
+    Computes the (16, 256) peak |correlation| scores of one sample window.
+    Runs in a worker process; the matrices are attached from shared memory.
+    
+    Args:
+        task (tuple): (traces_shm_name, traces_shape, traces_dtype, pts_shm_name, start, stop, batch_size)
+        
+    Returns:
+        numpy.ndarray: (16, 256) scores for samples [start, stop).
+    """
+    traces_name, shape, dtype, pts_name, start, stop, batch_size = task
+    traces_shm = shared_memory.SharedMemory(name=traces_name)
+    pts_shm = shared_memory.SharedMemory(name=pts_name)
+    try:
+        traces = np.ndarray(shape, dtype=dtype, buffer=traces_shm.buf)
+        pts = np.ndarray((shape[0], 16), dtype=np.uint8, buffer=pts_shm.buf)
+        accumulator = CpaAccumulator(stop - start)
+        for b0 in range(0, shape[0], batch_size):
+            accumulator.update(pts[b0:b0 + batch_size], traces[b0:b0 + batch_size, start:stop])
+        scores = accumulator.scores()
+        del traces, pts # Release the views before closing the shared memory
+        return scores
+    finally:
+        traces_shm.close()
+        pts_shm.close()
+
+def cpa_scores_parallel(plaintexts, traces, workers=4, window=256, batch_size=1000):
+    """
+    Computes the (16, 256) CPA score table (peak |correlation| per key byte and guess) with the
+    sample windows spread over a process pool.
+    
+    Args:
+        plaintexts: A list of plaintexts or a (n, 16) uint8 matrix.
+        traces: A list of NumPy arrays or a (n, samples) matrix (e.g., a TraceStore memmap view).
+        workers (int): Number of worker processes. 1 runs every window in-process.
+        window (int): Number of samples per work item.
+        batch_size (int): Number of traces per accumulator update.
+        
+    Returns:
+        numpy.ndarray: (16, 256) score table.
+    """
+    pts = plaintext_matrix(plaintexts)
+    n = len(pts)
+    num_samples = np.asarray(traces[0]).shape[0]
+    dtype = np.asarray(traces[0]).dtype
+
+    traces_shm = shared_memory.SharedMemory(create=True, size=max(1, n * num_samples * dtype.itemsize))
+    pts_shm = shared_memory.SharedMemory(create=True, size=max(1, n * 16))
+    try:
+        shared_traces = np.ndarray((n, num_samples), dtype=dtype, buffer=traces_shm.buf)
+        for b0 in range(0, n, batch_size): # Batched copy: lists of traces are never stacked in full
+            shared_traces[b0:b0 + batch_size] = np.asarray(traces[b0:b0 + batch_size])
+        np.ndarray((n, 16), dtype=np.uint8, buffer=pts_shm.buf)[:] = pts
+        del shared_traces
+
+        tasks = [(traces_shm.name, (n, num_samples), dtype, pts_shm.name, start,
+                  min(start + window, num_samples), batch_size)
+                 for start in range(0, num_samples, window)]
+        if workers <= 1:
+            window_scores = [_cpa_window_worker(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                window_scores = list(executor.map(_cpa_window_worker, tasks))
+    finally:
+        traces_shm.close()
+        traces_shm.unlink()
+        pts_shm.close()
+        pts_shm.unlink()
+
+    # The peak over all samples is the peak over the per-window peaks.
+    return np.max(np.stack(window_scores), axis=0)
+
+def run_parallel_cpa(plaintexts, traces, workers=4, window=256, batch_size=1000):
+    """
+    Runs the CPA with cpa_scores_parallel and returns the best guess for every key byte.
+    
+    Args:
+        plaintexts: A list of plaintexts or a (n, 16) uint8 matrix.
+        traces: A list of NumPy arrays or a (n, samples) matrix.
+        workers (int): Number of worker processes.
+        window (int): Number of samples per work item.
+        batch_size (int): Number of traces per accumulator update.
+        
+    Returns:
+        bytes: The recovered AES key (16 bytes). Returns None if CPA fails.
+    """
+    if len(plaintexts) == 0 or len(traces) == 0 or len(plaintexts) != len(traces):
+        print("[!] No valid plaintexts or traces available for CPA. Aborting.")
+        return None
+
+    print(f"[*] Starting CPA analysis on {workers} worker processes...")
+    scores = cpa_scores_parallel(plaintexts, traces, workers=workers, window=window, batch_size=batch_size)
+    key = bytes(np.argmax(scores, axis=1).astype(np.uint8))
+    for byte, guess in enumerate(key):
+        print(f"[Byte {byte:02d}] Best Guess: {hex(guess)}")
+    return key
+
+# --- Key Rank Estimation and Key Enumeration ---
+# Keeping only the argmax of each byte throws the attack away as soon as one byte is wrong.
+# The full (16, 256) score table instead turns into a likelihood for every key: peak correlations
+# are mapped through the Fisher z-transform (z = atanh(r) * sqrt(n - 3), roughly standard normal
+# for wrong guesses) to per-byte log-probabilities, and keys are enumerated best-first by their
+# summed log-probability. Each candidate costs one option-2 submission, so trying a few hundred
+# keys is far cheaper than another collection round.
+
+class KeyEnumerator:
+    """
+    Ranks and enumerates full AES keys from a (16, 256) CPA score table.
+    """
+    def __init__(self, scores, n_traces):
+        """
+        Args:
+            scores (numpy.ndarray): (16, 256) peak absolute correlation per key byte and guess
+                                    (CpaAccumulator.scores, lascar_cpa_scores, cpa_scores_parallel).
+            n_traces (int): Number of traces the scores were computed from.
+        """
+        scores = np.asarray(scores, dtype=np.float64)
+        if scores.shape != (16, 256):
+            raise ValueError(f"Expected a (16, 256) score table, got {scores.shape}.")
+        z = np.arctanh(np.clip(scores, 0.0, 1.0 - 1e-12)) * np.sqrt(max(n_traces - 3, 1))
+        log_likelihood = z ** 2 / 2
+        # Normalise per byte: log P(guess | scores), the guesses of a byte summing to 1.
+        peak = log_likelihood.max(axis=1, keepdims=True)
+        self.log_probabilities = log_likelihood - peak - np.log(np.exp(log_likelihood - peak).sum(axis=1, keepdims=True))
+        self.order = np.argsort(-self.log_probabilities, axis=1, kind='stable') # Guesses per byte, most likely first
+        # Cost of using the i-th best guess of a byte instead of its best one (non-decreasing in i).
+        sorted_log_p = np.take_along_axis(self.log_probabilities, self.order, axis=1)
+        self.costs = sorted_log_p[:, :1] - sorted_log_p
+
+    def best_key(self):
+        return bytes(self.order[:, 0].astype(np.uint8))
+
+    def log_probability(self, key):
+        """
+        Returns the model log-probability of a full key (sum of its per-byte log-probabilities).
+        """
+        return float(self.log_probabilities[np.arange(16), np.frombuffer(bytes(key), dtype=np.uint8)].sum())
+
+    def estimate_rank(self, key, bins=512):
+        """
+        Estimates the rank of 'key' among all 2^128 keys (1 = most likely) by histogram convolution:
+        the per-byte log-probabilities are binned, the 16 histograms convolved, and the keys in bins
+        more likely than the key's bin are counted.
+        
+        Args:
+            key (bytes): The 16-byte key to rank (e.g., the known key of a mock target).
+            bins (int): Number of histogram bins per byte; more bins give tighter bounds.
+            
+        Returns:
+            tuple: (lower_bound, estimate, upper_bound) of the rank. Binning moves every byte by
+                   less than one bin, so the bounds are the counts 16 bins around the key's bin.
+        """
+        cost = -self.log_probabilities
+        low = cost.min()
+        width = (cost.max() - low) / (bins - 1) or 1.0
+        bin_index = np.minimum(((cost - low) / width).astype(np.int64), bins - 1)
+        total = np.ones(1)
+        for byte in range(16):
+            total = np.convolve(total, np.bincount(bin_index[byte], minlength=bins).astype(np.float64))
+        key_bin = int(bin_index[np.arange(16), np.frombuffer(bytes(key), dtype=np.uint8)].sum())
+        cumulative = np.concatenate(([0.0], np.cumsum(total)))
+        lower = cumulative[max(key_bin - 16, 0)] + 1
+        estimate = cumulative[key_bin] + max(total[key_bin] / 2, 1)
+        upper = cumulative[min(key_bin + 17, len(total))]
+        return lower, estimate, upper
+
+    def candidates(self, limit=None):
+        """
+        Yields (key, log_probability) pairs in decreasing order of model probability.
+        
+        Best-first search over index vectors (the i-th best guess of every byte). Each vector has
+        a unique parent (its last non-zero index decremented), so every key is produced once, and
+        the heap holds at most 16 entries per key yielded.
+        
+        Args:
+            limit (int): Maximum number of keys to yield (unbounded if None).
+        """
+        best_log_p = float(self.log_probabilities.max(axis=1).sum())
+        rows = np.arange(16)
+        heap = [(0.0, (0,) * 16, 0)] # (cost, index vector, first position that may be incremented)
+        produced = 0
+        while heap and (limit is None or produced < limit):
+            cost, indices, first = heapq.heappop(heap)
+            yield bytes(self.order[rows, indices].astype(np.uint8)), best_log_p - cost
+            produced += 1
+            for byte in range(first, 16):
+                if indices[byte] + 1 < 256:
+                    child = indices[:byte] + (indices[byte] + 1,) + indices[byte + 1:]
+                    heapq.heappush(heap, (cost + self.costs[byte, indices[byte] + 1] - self.costs[byte, indices[byte]],
+                                          child, byte))
+
+# Substrings (lower case) of the server's answer to a wrong key. Only an answer recognised as a
+# rejection lets submit_key_candidates move on to the next candidate; anything else is reported
+# as the server's verdict on the key that was sent.
+KEY_REJECTION_MARKERS = (b'wrong', b'incorrect', b'invalid', b'denied', b'fail', b'not correct')
+
+def is_key_rejection(response, markers=KEY_REJECTION_MARKERS):
+    """
+    Returns True if the answer to a key submission (option 2) rejects the key.
+    """
+    response = response.lower()
+    return any(marker in response for marker in markers)
+
+def submit_key_candidates(enumerator, pool=None, max_candidates=16, workers=2, delay=0.1):
+    """
+    Submits the recovered key with option 2 (interact_with_server) and, only if the server clearly
+    rejects it, the next most likely keys until one is not rejected.
+    
+    The best key is always sent first and on its own. Enumeration only starts when its answer
+    matches KEY_REJECTION_MARKERS: an answer that is neither a rejection nor missing is taken as
+    the server's verdict, so an unexpected reply never triggers a burst of submissions.
+    Candidates are then sent in order of likelihood, up to 'workers' at a time with 'delay'
+    seconds between them, and outstanding submissions are abandoned once one is not rejected.
+    
+    Args:
+        enumerator (KeyEnumerator): Source of the candidate keys.
+        pool (ConnectionPool): Connection pool for the submissions (a new connection per request if None).
+        max_candidates (int): Maximum number of keys to submit, including the best key.
+        workers (int): Number of submissions in flight.
+        delay (float): Pause in seconds before each submission after the first.
+        
+    Returns:
+        tuple: (key, response, submitted) for the key that was not rejected, or (None, None, submitted).
+    """
+    best_key = enumerator.best_key()
+    response = interact_with_server(b'2', best_key.hex().encode(), pool)
+    if response is None:
+        print("[-] No answer to the recovered key; not enumerating further candidates.")
+        return None, None, 1
+    if not is_key_rejection(response):
+        return best_key, response, 1
+    if max_candidates <= 1:
+        print("[-] Recovered key rejected.")
+        return None, None, 1
+    print(f"[*] Recovered key rejected; trying up to {max_candidates - 1} more candidates...")
+
+    candidates = (key for key, _ in enumerator.candidates(max_candidates) if key != best_key)
+    submitted, failed = 1, 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+
+        def submit_next():
+            nonlocal submitted
+            for key in candidates:
+                time.sleep(delay)
+                futures[executor.submit(interact_with_server, b'2', key.hex().encode(), pool)] = key
+                submitted += 1
+                return True
+            return False
+
+        while len(futures) < workers and submit_next():
+            pass
+        while futures:
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                key = futures.pop(future)
+                response = future.result()
+                if response is None:
+                    failed += 1
+                elif not is_key_rejection(response):
+                    print(f"[+] Key accepted after {submitted} submitted candidates.")
+                    for pending in futures:
+                        pending.cancel()
+                    return key, response, submitted
+                submit_next()
+
+    print(f"[-] None of the {submitted} most likely keys was accepted ({failed} submissions got no answer).")
+    return None, None, submitted
+
 # --- Main Execution Block ---
+# Directory of the on-disk trace store. Re-running the script resumes an interrupted
+# collection from the traces committed there; delete it when switching to a new instance.
+TRACE_STORE_PATH = 'trace_store'
+# Seed of the plaintext campaign; None draws a fresh one (printed and recorded in the store).
+PLAINTEXT_SEED = None
+# Number of most likely keys submitted (after a clear rejection of the recovered key) before
+# giving up and collecting more traces.
+KEY_CANDIDATES = 16
+# Collection threads to start with, and the most the adaptive controller may grow to. Kept
+# modest: the challenge asks for a delay between connections to keep the target stable.
+COLLECTION_WORKERS = 8
+COLLECTION_MAX_WORKERS = 16
+# Acquisition telemetry of the last run, written next to the trace store.
+TELEMETRY_PATH = os.path.join(TRACE_STORE_PATH, 'telemetry.json')
+
 if __name__ == "__main__":
     print("[*] Starting DPA script...")
     # Step 1: Collect power traces from the remote server.
-    # We aim for 1000 traces, using 20 workers for parallelism,
-    # and allow up to 5 times more attempts than successful traces needed (1000 * 5 = 5000 total attempts)
-    # to account for network flakiness.
-    pts, trs = collect_traces_parallel(n=1000, workers=20, max_overall_attempts_factor=5)
+    # We collect up to 5000 traces with COLLECTION_WORKERS threads (adapting up to COLLECTION_MAX_WORKERS)
+    # over a connection pool that reuses kept-open sessions and otherwise keeps a couple of connections
+    # ready ahead of demand, and allow up to 5 times more attempts than successful traces needed to
+    # account for network flakiness. The same pool later carries the key submissions.
+    # An online CPA runs alongside and stops the collection as soon as every key byte's best guess
+    # has been stable for 300 traces, so we neither over-collect nor find out too late.
+    # Traces are written to the on-disk store as they arrive, and the CPA reads them back zero-copy.
+    # Plaintexts come from a seeded generator whose seed is recorded in the store's meta.json, so an
+    # interrupted run resumes without reusing plaintexts. The plaintexts saved next to the traces
+    # are what the analysis uses; the seed alone does not reproduce which rows were stored.
+    store = TraceStore(TRACE_STORE_PATH, capacity=1000, target=f"{HOST}:{PORT}")
+    plaintext_generator = PlaintextGenerator(seed=PLAINTEXT_SEED)
+    print(f"[*] Plaintext campaign seed: {plaintext_generator.seed}")
+    online_cpa = OnlineCpa(stable_traces=300, update_every=100)
+    # Per-phase latencies, retry/timeout counters and in-flight requests are recorded for the run
+    # and exported to TELEMETRY_PATH; the callback prints a progress line every 5 seconds.
+    telemetry = AcquisitionTelemetry(
+        progress_callback=lambda snap: print(f"[*] {snap['collected']}/{snap['target']} traces, "
+                                             f"{snap['rate']:.1f} traces/s, {snap['in_flight']} in flight"),
+        progress_interval=5.0)
+    pool = ConnectionPool(size=COLLECTION_MAX_WORKERS, prefetch=2)
+    pts, trs = collect_traces_parallel(n=5000, workers=COLLECTION_WORKERS, max_workers=COLLECTION_MAX_WORKERS,
+                                       max_overall_attempts_factor=5, pool=pool, store=store,
+                                       online_cpa=online_cpa, plaintext_generator=plaintext_generator,
+                                       telemetry=telemetry)
+    telemetry.export_json(TELEMETRY_PATH)
 
-    if pts and trs:
+    if len(pts) and len(trs):
         print(f"[+] Successfully collected {len(pts)} traces. Proceeding with CPA.")
-        # Step 2: Run the CPA session to recover the key using the collected data.
-        recovered_key = run_lascar_session(pts, trs)
+        # Step 2: The online CPA already holds the statistics of every collected trace; its best
+        # guesses are the same as those of run_numpy_cpa / run_lascar_session on the same traces.
+        online_cpa.report()
+        recovered_key = online_cpa.best_key()
 
         if recovered_key:
             print("\n[+] Recovered Key:", recovered_key.hex())
-            print("[*] Verifying recovered key with server...")
-            # Step 3: Send the recovered key to the server for final verification.
-            # Option '2' is typically used for key submission.
-            response = interact_with_server(b'2', recovered_key.hex().encode())
+            # Step 3: Send the recovered key to the server for final verification (option '2').
+            # If the server clearly rejects it, the next most likely keys from the full score table
+            # are submitted over the pool until one is not rejected.
+            enumerator = KeyEnumerator(online_cpa.accumulator.scores(), online_cpa.n)
+            print(f"[*] Verifying recovered key with server (up to {KEY_CANDIDATES} candidates)...")
+            key, response, submitted = submit_key_candidates(enumerator, pool=pool, max_candidates=KEY_CANDIDATES)
             if response:
+                if key != recovered_key:
+                    print("[+] Accepted Key:", key.hex())
                 print("[+] Server Response (Flag/Verification):", response.decode('ascii', errors='ignore'))
             else:
-                print("[-] Failed to get a response from the server during key verification.")
+                print("[-] No candidate key was accepted; collect more traces and retry.")
         else:
             print("[-] Key recovery failed due to insufficient or problematic trace data. Cannot verify.")
     else:
         print("[-] Trace collection failed. Cannot proceed with DPA.")
+    pool.close()
+    store.close()
     print("[*] Script execution finished.")
 
 
@@ -0,0 +1,510 @@
+import asyncio
+import base64
+import socket
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import socket_interface as si
+from mock_server import MockPowerServer, MockPowerTarget
+
+
+# --- Helpers ---
+def send_later(sock, chunks, pause=0.05, close=False):
+    """
+    Sends 'chunks' from a background thread with a pause before each, so every chunk
+    arrives in its own recv_into call.
+    """
+    def run():
+        for chunk in chunks:
+            time.sleep(pause)
+            sock.sendall(chunk)
+        if close:
+            sock.close()
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def trace_line(num_samples=100):
+    return base64.b64encode(np.arange(num_samples, dtype=np.float64).tobytes())
+
+class ScriptedServer:
+    """
+    One-shot servers for the pool tests: 'handle(conn)' runs for every accepted connection.
+    """
+    def __init__(self, handle):
+        self.sock = socket.socket()
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.listen()
+        self.address = self.sock.getsockname()
+        self.handle = handle
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._run, args=(conn,), daemon=True).start()
+
+    def _run(self, conn):
+        try:
+            self.handle(conn)
+        except OSError:
+            pass
+        finally:
+            conn.close()
+
+    def close(self):
+        self.sock.close()
+
+@pytest.fixture
+def mock_server():
+    with MockPowerServer(keep_alive=True, seed=7, noise=0.5) as server:
+        yield server
+
+@pytest.fixture
+def socket_pair():
+    a, b = socket.socketpair()
+    a.settimeout(2.0)
+    yield a, b
+    a.close()
+    b.close()
+
+
+# --- ResponseReader ---
+def test_reader_finds_delimiter_split_across_reads(socket_pair):
+    client, server = socket_pair
+    reader = si.ResponseReader(initial_size=4) # Also grows the buffer
+    send_later(server, [b'\r\n  abc', b'def\r', b'\nmenu'])
+    payload, end = reader.read(client, delimiter=b'\r\n')
+    assert (payload, end) == (b'abcdef', 'delimiter')
+    assert reader.trailing == b'menu'
+
+def test_reader_stops_at_close_without_delimiter(socket_pair):
+    client, server = socket_pair
+    send_later(server, [b'partial'], close=True)
+    assert si.ResponseReader().read(client, delimiter=b'\n') == (b'partial', 'close')
+
+def test_reader_reports_timeout_mid_payload(socket_pair):
+    client, server = socket_pair
+    client.settimeout(0.2)
+    send_later(server, [b'abc']) # No delimiter, connection left open
+    assert si.ResponseReader().read(client, delimiter=b'\n') == (b'abc', 'timeout')
+    assert client.gettimeout() == 0.2
+
+def test_reader_idle_timeout_ends_unframed_response(socket_pair):
+    client, server = socket_pair
+    send_later(server, [b'Correct key!', b' HTB{x}'], pause=0.01)
+    start = time.perf_counter()
+    payload, end = si.ResponseReader().read(client, delimiter=None, idle_timeout=0.1)
+    assert (payload, end) == (b'Correct key! HTB{x}', 'timeout')
+    assert time.perf_counter() - start < 1.0 # Well below the 2 s socket timeout
+    assert client.gettimeout() == 2.0
+
+def test_read_payload_lines_skips_menus_between_answers(socket_pair):
+    client, server = socket_pair
+    line = trace_line()
+    send_later(server, [b'menu\n> Data: ' + line[:10], line[10:] + b'\nmenu\n> Data: ', line + b'\nmenu\n>'])
+    reader = si.ResponseReader(initial_size=16)
+    payloads, end = reader.read_payload_lines(client, 2, si._is_trace_payload)
+    assert (payloads, end) == ([line, line], 'complete')
+    assert reader.trailing == b'menu\n>'
+
+
+# --- ConnectionPool ---
+def test_pool_reuses_kept_open_sessions(mock_server):
+    pool = si.ConnectionPool(*mock_server.server_address, size=2, prefetch=0)
+    try:
+        for _ in range(5):
+            raw = pool.request(b'1', bytes(16))
+            assert si.b64_decode_trace(raw).shape == (mock_server.target.samples,)
+        stats = pool.stats()
+    finally:
+        pool.close()
+    assert stats['handshakes'] == 1
+    assert stats['requests'] == 5 and stats['reused_requests'] == 4 and stats['request_failures'] == 0
+
+def test_pool_retries_session_dropped_while_idle(mock_server):
+    pool = si.ConnectionPool(*mock_server.server_address, size=2, prefetch=0)
+    try:
+        assert pool.request(b'1', bytes(16)) is not None
+        for conn in list(pool._idle.queue):
+            conn.sock.shutdown(socket.SHUT_RDWR) # The server side appears to have hung up
+        assert pool.request(b'1', bytes(16)) is not None
+    finally:
+        pool.close()
+
+def test_pool_submits_key_over_fresh_connections_without_keep_alive():
+    with MockPowerServer(keep_alive=False, seed=3) as server:
+        pool = si.ConnectionPool(*server.server_address, size=2, prefetch=0)
+        try:
+            assert b'HTB{' in pool.request(b'2', server.target.key.hex().encode())
+            assert b'HTB{' not in pool.request(b'2', bytes(16).hex().encode())
+        finally:
+            pool.close()
+
+def test_pool_rejects_framed_response_that_stalls_mid_payload():
+    line = trace_line()
+
+    def handle(conn):
+        conn.sendall(b'menu\n> ')
+        conn.recv(1)
+        conn.sendall(b'Data: ')
+        conn.recv(16)
+        conn.sendall(line[:40]) # Half a trace, then silence longer than the idle timeout
+        time.sleep(0.5)
+        conn.sendall(line[40:] + b'\n')
+
+    server = ScriptedServer(handle)
+    pool = si.ConnectionPool(*server.address, size=1, prefetch=0, timeout=0.3, idle_timeout=0.05)
+    try:
+        assert pool.request(b'1', bytes(16)) is None
+    finally:
+        pool.close()
+        server.close()
+
+def test_pool_waits_for_delimiter_despite_idle_timeout():
+    line = trace_line()
+
+    def handle(conn):
+        conn.sendall(b'menu\n> ')
+        conn.recv(1)
+        conn.sendall(b'Data: ')
+        conn.recv(16)
+        conn.sendall(line[:40]) # Pause well beyond the idle timeout, within the socket timeout
+        time.sleep(0.2)
+        conn.sendall(line[40:] + b'\n')
+
+    server = ScriptedServer(handle)
+    pool = si.ConnectionPool(*server.address, size=1, prefetch=0, timeout=2.0, idle_timeout=0.01)
+    try:
+        assert pool.request(b'1', bytes(16)) == line
+    finally:
+        pool.close()
+        server.close()
+
+def test_close_without_newline_ends_payload_in_every_client(monkeypatch):
+    with MockPowerServer(newline=False, seed=5) as server:
+        monkeypatch.setattr(si, 'HOST', server.server_address[0])
+        monkeypatch.setattr(si, 'PORT', server.server_address[1])
+        pool = si.ConnectionPool(*server.server_address, size=1, prefetch=0)
+        try:
+            answers = [pool.request(b'1', bytes(16)), si.interact_with_server(b'1', bytes(16)),
+                       asyncio.run(si.interact_with_server_async(b'1', bytes(16)))]
+        finally:
+            pool.close()
+    for raw in answers:
+        assert si.b64_decode_trace(raw).shape == (server.target.samples,)
+
+def test_request_batch_pipelines_on_one_session(mock_server):
+    pool = si.ConnectionPool(*mock_server.server_address, size=2, prefetch=0)
+    try:
+        pts = [bytes([i]) * 16 for i in range(10)]
+        responses = pool.request_batch(b'1', pts)
+        traces, valid = si.b64_decode_traces(responses)
+        assert valid.all()
+    finally:
+        pool.close()
+    # Each answer belongs to its own plaintext: recompute the noise-free leakage at the first leak.
+    leak = mock_server.target.leak_positions[0]
+    expected = mock_server.target.leakage(si.plaintext_matrix(pts))[:, 0] + mock_server.target.baseline[leak]
+    assert np.corrcoef(traces[:, leak], expected)[0, 1] > 0.9
+
+def test_request_batch_falls_back_when_server_swallows_pipelined_requests():
+    line = trace_line()
+
+    def handle(conn):
+        # Reads whatever is queued instead of exactly one option byte and 16 data bytes
+        while True:
+            conn.sendall(b'menu\n> ')
+            if not conn.recv(1024):
+                return
+            conn.sendall(b'Data: ')
+            conn.recv(1024)
+            conn.sendall(line + b'\n')
+
+    server = ScriptedServer(handle)
+    telemetry = si.AcquisitionTelemetry()
+    pool = si.ConnectionPool(*server.address, size=2, prefetch=0, timeout=0.3, telemetry=telemetry)
+    try:
+        assert pool.request_batch(b'1', [bytes(16)] * 4) == [line] * 4
+    finally:
+        pool.close()
+        server.close()
+    assert telemetry.counters['batch_fallbacks'] == 1
+
+
+# --- Trace decoding ---
+def test_decode_trace_checks_length():
+    raw = trace_line(100)
+    assert si.b64_decode_trace(raw, num_samples=100).shape == (100,)
+    with pytest.raises(ValueError):
+        si.b64_decode_trace(raw, num_samples=99)
+    with pytest.raises(ValueError):
+        si.b64_decode_trace(b'')
+
+def test_decode_traces_marks_bad_rows_invalid():
+    good, short = trace_line(100), trace_line(60)
+    traces, valid = si.b64_decode_traces([good, None, short, b'!!notbase64', good])
+    assert list(valid) == [True, False, False, False, True]
+    assert np.array_equal(traces[4], np.arange(100))
+    _, valid = si.b64_decode_traces([short, good], num_samples=100)
+    assert list(valid) == [False, True]
+
+
+# --- TraceStore ---
+def test_store_resumes_from_committed_rows(tmp_path):
+    rng = np.random.default_rng(0)
+    pts = rng.integers(0, 256, (300, 16), dtype=np.uint8)
+    traces = rng.normal(size=(300, 50))
+    store = si.TraceStore(str(tmp_path), capacity=200, commit_every=100, target='a:1')
+    for pt, trace in zip(pts[:130], traces[:130]):
+        store.append(pt.tobytes(), trace)
+    store.append_batch(pts[130:180], traces[130:180])
+    del store # Interrupted without close(): only the rows of the commit at 100 are kept
+
+    store = si.TraceStore(str(tmp_path), target='a:1')
+    assert store.count == store.committed == 100
+    assert store.num_samples == 50
+    assert np.array_equal(store.traces, traces[:100])
+    assert np.array_equal(store.plaintexts, pts[:100])
+    store.append_batch(pts[100:], traces[100:]) # Overwrites the uncommitted rows and grows the store
+    store.close()
+
+    loaded_pts, loaded_traces = si.load_trace_store(str(tmp_path))
+    assert np.array_equal(loaded_pts, pts) and np.array_equal(loaded_traces, traces)
+
+def test_store_rejects_traces_of_another_length(tmp_path):
+    store = si.TraceStore(str(tmp_path))
+    store.append(bytes(16), np.zeros(50))
+    with pytest.raises(ValueError):
+        store.append(bytes(16), np.zeros(49))
+
+def test_sink_drops_traces_of_another_length(tmp_path):
+    store = si.TraceStore(str(tmp_path))
+    sink = si._TraceSink(100, store)
+    assert sink.num_samples is None
+    assert sink.add(bytes(16), np.zeros(50)) == 0
+    assert sink.add(bytes(16), np.zeros(49)) == 1
+    assert sink.add_batch(np.zeros((3, 16), dtype=np.uint8), np.zeros((3, 49))) == 3
+    assert store.count == 1 and sink.num_samples == 50
+
+def test_collection_resumes_from_store(mock_server, tmp_path):
+    pool = si.ConnectionPool(*mock_server.server_address, size=4, prefetch=0)
+    try:
+        store = si.TraceStore(str(tmp_path), commit_every=10)
+        si.collect_traces_parallel(n=30, workers=4, pool=pool, store=store, adaptive=False)
+        store.close()
+        store = si.TraceStore(str(tmp_path), commit_every=10)
+        assert store.count == 30
+        pts, traces = si.collect_traces_parallel(n=60, workers=4, pool=pool, store=store,
+                                                 batch_size=5, adaptive=False)
+    finally:
+        pool.close()
+    assert len(pts) == len(traces) == 60
+    assert traces.shape[1] == mock_server.target.samples
+
+
+def test_asyncio_collector_collects_requested_traces(mock_server, monkeypatch):
+    monkeypatch.setattr(si, 'HOST', mock_server.server_address[0])
+    monkeypatch.setattr(si, 'PORT', mock_server.server_address[1])
+    pts, traces = si.collect_traces_asyncio(n=40, concurrency=4)
+    assert len(pts) == len(traces) == 40
+    assert all(len(trace) == mock_server.target.samples for trace in traces)
+
+
+# --- Adaptive concurrency ---
+def run_round(controller, latency, failures=0):
+    limit = controller.limit
+    for _ in range(failures):
+        controller.on_failure()
+    for _ in range(limit - failures):
+        controller.on_success(latency)
+
+def test_controller_sets_baseline_after_warmup_and_counts_decreases(capsys):
+    telemetry = si.AcquisitionTelemetry()
+    controller = si.ConcurrencyController(8, minimum=2, maximum=8, cooldown=0.0, telemetry=telemetry)
+    for latency in (0.010, 0.050, 0.030): # A slow warm-up round does not become the threshold
+        run_round(controller, latency)
+    assert controller.base_latency == pytest.approx(0.030)
+    run_round(controller, 0.080) # Within 3x the warm-up mean
+    assert controller.limit == 8
+    run_round(controller, 0.200)
+    assert controller.limit == 4
+    run_round(controller, 0.030, failures=2)
+    assert controller.limit == 2
+    assert telemetry.counters == {'congestion_latency': 1, 'congestion_failures': 1}
+    assert capsys.readouterr().out == ''
+
+def test_controller_baseline_follows_lasting_slowdown():
+    controller = si.ConcurrencyController(8, minimum=2, maximum=8, cooldown=0.0, warmup_rounds=1)
+    run_round(controller, 0.010)
+    for _ in range(100): # The server stays five times slower
+        run_round(controller, 0.050)
+    assert controller.base_latency > 0.050 / 3
+    assert controller.limit == 8
+
+
+# --- CPA ---
+@pytest.fixture(scope='module')
+def campaign():
+    target = MockPowerTarget(seed=11, noise=0.5, samples=900)
+    pts = np.random.default_rng(1).integers(0, 256, (800, 16), dtype=np.uint8)
+    return target, pts, target.traces(pts)
+
+def test_numpy_cpa_matches_lascar(campaign):
+    pytest.importorskip('lascar')
+    target, pts, traces = campaign
+    accumulator = si.CpaAccumulator(traces.shape[1])
+    accumulator.update(pts, traces)
+    lascar_scores = si.lascar_cpa_scores(pts, traces)
+    assert np.allclose(accumulator.scores(), lascar_scores, atol=1e-9)
+    assert accumulator.best_key() == target.key
+
+def test_accumulator_is_independent_of_batching(campaign):
+    _, pts, traces = campaign
+    whole = si.CpaAccumulator(traces.shape[1])
+    whole.update(pts, traces)
+    batched = si.CpaAccumulator(traces.shape[1])
+    for start in range(0, len(pts), 77):
+        batched.update(pts[start:start + 77], list(traces[start:start + 77]))
+    assert np.allclose(whole.scores(), batched.scores())
+
+def test_online_cpa_replays_store_in_batches(campaign):
+    _, pts, traces = campaign
+    online = si.OnlineCpa()
+    online.update(pts, traces, batch_size=64)
+    reference = si.CpaAccumulator(traces.shape[1])
+    reference.update(pts, traces)
+    assert online.n == len(pts)
+    assert np.allclose(online.accumulator.scores(), reference.scores())
+
+def test_online_cpa_converges_on_the_key(campaign):
+    target, pts, traces = campaign
+    online = si.OnlineCpa(stable_traces=200, update_every=50, min_traces=200)
+    for i, (pt, trace) in enumerate(zip(pts, traces)):
+        online.add(pt.tobytes(), trace)
+        if online.converged:
+            break
+    assert online.converged and i < len(pts) - 1
+    assert online.best_key() == target.key
+
+def test_key_enumerator_ranks_recovered_key_first(campaign):
+    target, pts, traces = campaign
+    accumulator = si.CpaAccumulator(traces.shape[1])
+    accumulator.update(pts, traces)
+    enumerator = si.KeyEnumerator(accumulator.scores(), accumulator.n)
+    lower, estimate, upper = enumerator.estimate_rank(target.key)
+    assert lower <= 1 <= upper and estimate < 2
+    assert next(enumerator.candidates())[0] == target.key
+
+def test_key_enumerator_finds_key_with_second_best_byte():
+    rng = np.random.default_rng(2)
+    scores = rng.uniform(0.0, 0.1, (16, 256))
+    key = bytes(rng.integers(0, 256, 16, dtype=np.uint8))
+    scores[np.arange(16), list(key)] = 0.5
+    scores[3, key[3] ^ 1] = 0.55 # Byte 3's best guess is wrong, its runner-up is right
+    enumerator = si.KeyEnumerator(scores, 500)
+    candidates = [candidate for candidate, _ in enumerator.candidates(limit=5)]
+    assert candidates[1] == key and candidates[0] != key
+    log_probabilities = [log_p for _, log_p in enumerator.candidates(limit=50)]
+    assert all(a >= b for a, b in zip(log_probabilities, log_probabilities[1:]))
+    lower, _, upper = enumerator.estimate_rank(key)
+    assert lower <= 2 <= upper
+
+
+# --- Key submission ---
+def scores_for(key, wrong_byte=None):
+    """
+    Synthetic CPA scores ranking 'key' first, or second if 'wrong_byte' has a better runner-up.
+    """
+    rng = np.random.default_rng(4)
+    scores = rng.uniform(0.0, 0.1, (16, 256))
+    scores[np.arange(16), list(key)] = 0.5
+    if wrong_byte is not None:
+        scores[wrong_byte, key[wrong_byte] ^ 1] = 0.55
+    return si.KeyEnumerator(scores, 500)
+
+def test_submit_sends_only_the_recovered_key_when_accepted():
+    with MockPowerServer(seed=3) as server:
+        pool = si.ConnectionPool(*server.server_address, size=2, prefetch=0)
+        try:
+            key, response, submitted = si.submit_key_candidates(scores_for(server.target.key), pool=pool)
+        finally:
+            pool.close()
+        assert (key, submitted) == (server.target.key, 1) and b'Correct key!' in response
+        assert server.counters['keys'] == 1
+
+def test_submit_enumerates_after_a_rejection():
+    with MockPowerServer(seed=3) as server:
+        pool = si.ConnectionPool(*server.server_address, size=2, prefetch=0)
+        try:
+            key, response, submitted = si.submit_key_candidates(scores_for(server.target.key, wrong_byte=5),
+                                                                pool=pool, delay=0.0)
+        finally:
+            pool.close()
+    assert key == server.target.key and submitted >= 2
+
+def test_submit_does_not_enumerate_after_an_unrecognised_answer():
+    def handle(conn):
+        conn.sendall(b'menu\n> ')
+        conn.recv(1)
+        conn.sendall(b'Data: ')
+        conn.recv(32)
+        conn.sendall(b'Service temporarily unavailable\n')
+
+    server = ScriptedServer(handle)
+    pool = si.ConnectionPool(*server.address, size=2, prefetch=0)
+    enumerator = scores_for(bytes(range(16)))
+    try:
+        key, response, submitted = si.submit_key_candidates(enumerator, pool=pool)
+    finally:
+        pool.close()
+        server.close()
+    assert (key, submitted) == (enumerator.best_key(), 1) and b'unavailable' in response
+
+
+# --- Preprocessing ---
+def test_int16_preprocessing_saturates_out_of_range_samples(campaign):
+    _, pts, traces = campaign
+    preprocessor = si.TracePreprocessor(dtype='int16', pois_per_byte=4)
+    reduced = preprocessor.fit_transform(pts, traces)
+    assert reduced.min() == -32767 and reduced.max() == 32767
+    pois = preprocessor.sample_indices
+    # Samples far outside the fitted range saturate instead of wrapping around
+    outliers = traces[:2].copy()
+    outliers[0, pois] = traces[:, pois].max(axis=0) + 100.0
+    outliers[1, pois] = traces[:, pois].min(axis=0) - 100.0
+    saturated = preprocessor.transform(outliers)
+    assert np.all(saturated[0] == 32767) and np.all(saturated[1] == -32767)
+
+def sost_reference(counts, means, variances):
+    sost = np.zeros((16, means.shape[2]))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        std_err2 = np.where(counts > 1, variances / counts, np.nan)
+        for b in range(16):
+            for i in range(255):
+                diff2 = (means[b, i] - means[b, i + 1:]) ** 2
+                denom = std_err2[b, i] + std_err2[b, i + 1:]
+                sost[b] += np.nansum(np.where(denom > 0, diff2 / denom, 0.0), axis=0)
+    return sost
+
+def test_sost_matches_pairwise_loop():
+    rng = np.random.default_rng(3)
+    counts = rng.integers(0, 6, (16, 256, 1)).astype(np.float64) # Includes empty and single-trace classes
+    means = rng.normal(size=(16, 256, 150))
+    variances = rng.uniform(0.0, 2.0, (16, 256, 150))
+    variances[2, 3:5, :10] = 0.0 # Pairs without any spread are skipped
+    assert np.allclose(si.TracePreprocessor._sost(counts, means, variances, chunk=64),
+                       sost_reference(counts, means, variances))
+
+def test_preprocessing_counts_bytes_of_every_trace(campaign):
+    _, pts, traces = campaign
+    preprocessor = si.TracePreprocessor(method='sost', pois_per_byte=4).fit(pts, traces)
+    preprocessor.transform(list(traces[:10]))
+    preprocessor.transform(traces[10:30])
+    assert preprocessor.input_bytes == traces[:30].nbytes
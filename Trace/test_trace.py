@@ -0,0 +1,222 @@
+import importlib.util
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# trace.py shares its name with the standard library's trace module, so it is loaded from its path.
+HERE = os.path.dirname(os.path.abspath(__file__))
+_spec = importlib.util.spec_from_file_location('trace_decoder', os.path.join(HERE, 'trace.py'))
+trace = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(trace)
+
+CAPTURE = os.path.join(HERE, 'traces.csv')
+EXPECTED_STRING = 'I####IM##MM#MM#MMM#MMMMHNMM#IM##M#MMM#MMM#'
+
+
+# --- Reference implementation (the original per-pixel, per-sample and per-template loops) ---
+def reference_pixel_states(gpio_data, name_to_idx):
+    states = np.zeros((8, 8, len(gpio_data)), dtype=int)
+    for (r, c), (row_gpio, col_gpio) in trace.OUTPUT_MATRIX_POS_TO_GPIO_PAIR.items():
+        states[r, c] = (gpio_data[:, name_to_idx[row_gpio]] == 1) & (gpio_data[:, name_to_idx[col_gpio]] == 1)
+    return states
+
+def reference_frames(states, window=trace.REFRESH_WINDOW):
+    return [(np.rot90(states[:, :, i - window + 1:i + 1].sum(axis=2), k=1), i)
+            for i in range(window - 1, states.shape[2])]
+
+def reference_match(composite, templates=trace.CHARACTER_TEMPLATES):
+    best_char, best_conf = '?', 0.0
+    for transform in trace.BLOCK_TRANSFORMATIONS.values():
+        binarized = (transform(composite) > 0).astype(int)
+        char, score = '?', -1
+        for name, template in templates.items():
+            matches = np.sum(binarized == template)
+            if matches > score:
+                char, score = name, matches
+        if score / 64.0 > best_conf:
+            best_char, best_conf = char, score / 64.0
+    return best_char, best_conf
+
+def reference_decode(csv_file_path, threshold=trace.TIME_JUMP_THRESHOLD):
+    df = pd.read_csv(csv_file_path)
+    times = df[trace.TIME_COLUMN].to_numpy()
+    gpio = df[trace.ALL_REQUIRED_GPIOS]
+    name_to_idx = {name: gpio.columns.get_loc(name) for name in trace.ALL_REQUIRED_GPIOS}
+    frames = reference_frames(reference_pixel_states(gpio.to_numpy(dtype=int), name_to_idx))
+    blocks, current = [], []
+    for matrix, idx in frames:
+        if current and times[idx] - times[current[-1][1]] > threshold:
+            blocks.append(current)
+            current = []
+        current.append((matrix, idx))
+    if current:
+        blocks.append(current)
+    return [(reference_match(np.sum([m for m, _ in block], axis=0)), block[0][1]) for block in blocks]
+
+def random_packed_frames(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return trace.pack_pixel_states(rng.random((n, 8)) < 0.5, rng.random((n, 8)) < 0.5)
+
+
+# --- Decoder equivalence ---
+def test_streaming_decoder_matches_reference_pipeline():
+    string, infos, samples = trace.decode_capture_stream(CAPTURE, verbose=False)
+    reference = reference_decode(CAPTURE)
+    assert string == EXPECTED_STRING
+    assert string == ''.join(char for (char, _), _ in reference)
+    assert [info['frame_num'] for info in infos] == [start for _, start in reference]
+    assert np.allclose([info['confidence'] for info in infos], [conf for (_, conf), _ in reference])
+    assert samples == len(pd.read_csv(CAPTURE))
+
+def test_live_decoder_matches_offline():
+    with open(CAPTURE) as f:
+        live = list(trace.decode_live(f))
+    _, infos, _ = trace.decode_capture_stream(CAPTURE, verbose=False)
+    assert [info['char'] for info in live] == [info['char'] for info in infos]
+    assert [info['frame_num'] for info in live] == [info['frame_num'] for info in infos]
+    assert [info['transformation'] for info in live] == [info['transformation'] for info in infos]
+
+def test_capture_path_argument_decodes_once_and_exits(tmp_path):
+    env = dict(os.environ, MPLBACKEND='Agg')
+    result = subprocess.run([sys.executable, os.path.join(HERE, 'trace.py'), CAPTURE], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0
+    assert EXPECTED_STRING in result.stdout
+
+
+
+# --- Frame reconstruction ---
+def test_pixel_states_match_reference():
+    rng = np.random.default_rng(1)
+    gpio = rng.integers(0, 2, (500, len(trace.ALL_REQUIRED_GPIOS)))
+    name_to_idx = {name: i for i, name in enumerate(trace.ALL_REQUIRED_GPIOS)}
+    packed = trace.reconstruct_packed_pixel_states(gpio, name_to_idx)
+    expected = reference_pixel_states(gpio, name_to_idx)
+    assert np.array_equal(trace.unpack_pixel_frames(packed), np.moveaxis(expected, 2, 0))
+    assert np.array_equal(trace.pack_pixel_frames(np.moveaxis(expected, 2, 0)), packed)
+    # The original interface still returns the (8, 8, N) states
+    assert np.array_equal(trace.reconstruct_pixel_states_optimized(gpio, name_to_idx), expected)
+
+
+# --- Sliding-window aggregation (cumsum lanes) ---
+@pytest.mark.parametrize('window', [1, 8, 255, 256, 300])
+def test_lane_packed_window_sums_match_naive_sums(window):
+    packed = random_packed_frames(window + 700, seed=window)
+    # A chunk size that does not divide the frame count also covers the chunk boundaries.
+    frames, sample_indices = trace.aggregate_packed_frames(packed, window, chunk_size=97)
+    pixels = trace.unpack_pixel_frames(packed).astype(np.int64)
+    expected = np.array([np.rot90(pixels[i - window + 1:i + 1].sum(axis=0), k=1)
+                         for i in range(window - 1, len(packed))])
+    assert np.array_equal(frames, expected)
+    assert np.array_equal(sample_indices, np.arange(window - 1, len(packed)))
+
+def test_aggregation_of_short_input_is_empty():
+    frames, sample_indices = trace.aggregate_packed_frames(random_packed_frames(5), window=8)
+    assert frames.shape == (0, 8, 8) and len(sample_indices) == 0
+
+def test_original_aggregation_interface_returns_frame_tuples():
+    states = np.moveaxis(trace.unpack_pixel_frames(random_packed_frames(100, seed=6)), 0, 2).astype(int)
+    frames = trace.aggregate_and_rotate_frames_optimized(states)
+    expected = reference_frames(states)
+    assert [idx for _, idx in frames] == [idx for _, idx in expected]
+    assert all(np.array_equal(matrix, ref) for (matrix, _), (ref, _) in zip(frames, expected))
+
+
+# --- Chunked ingestion (FrameAggregator and BlockSegmenter carry-over) ---
+def test_frame_aggregator_carries_windows_across_chunks():
+    packed = random_packed_frames(1000, seed=2)
+    times = np.arange(1000, dtype=np.float64)
+    expected_frames, expected_indices = trace.aggregate_packed_frames(packed)
+
+    aggregator = trace.FrameAggregator()
+    bounds = [0, 3, 4, 11, 500, 503, 1000] # Chunks shorter than the window included
+    outputs = [aggregator.feed(times[a:b], packed[a:b]) for a, b in zip(bounds, bounds[1:])]
+    frames = np.concatenate([frames for frames, _, _ in outputs])
+    frame_times = np.concatenate([frame_times for _, frame_times, _ in outputs])
+    indices = np.concatenate([indices for _, _, indices in outputs])
+    assert np.array_equal(frames, expected_frames)
+    assert np.array_equal(indices, expected_indices)
+    assert np.array_equal(frame_times, times[expected_indices])
+
+def test_block_segmenter_carries_open_block_across_chunks():
+    rng = np.random.default_rng(3)
+    frames = rng.integers(0, 9, (400, 8, 8))
+    # Blocks of random length separated by large gaps, with some gaps at chunk boundaries
+    frame_times = np.cumsum(np.where(rng.random(400) < 0.05, 1.0, 0.001))
+    sample_indices = np.arange(400) + 7
+    expected, starts = trace.segment_character_blocks(frames, frame_times, threshold=0.01)
+
+    segmenter = trace.BlockSegmenter(threshold=0.01)
+    blocks = []
+    bounds = [0, 1, 50, 51, 233, 400]
+    for a, b in zip(bounds, bounds[1:]):
+        blocks.extend(segmenter.feed(frames[a:b], frame_times[a:b], sample_indices[a:b]))
+    blocks.append(segmenter.close())
+    assert len(blocks) == len(expected)
+    assert np.array_equal(np.array([composite for composite, _ in blocks]), expected)
+    assert [first for _, first in blocks] == list(sample_indices[starts])
+
+def test_chunk_size_does_not_change_decoding():
+    small, _, _ = trace.decode_capture_stream(CAPTURE, chunk_rows=7, verbose=False)
+    assert small == EXPECTED_STRING
+
+
+# --- Template matching (popcount scores) ---
+def test_popcount_matches_bit_counts():
+    values = np.random.default_rng(4).integers(0, 2**63, 1000, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+    assert list(trace.popcount64(values)) == [bin(int(v)).count('1') for v in values]
+
+def test_compiled_templates_match_sequential_search():
+    rng = np.random.default_rng(5)
+    composites = rng.integers(0, 3, (300, 8, 8)) * (rng.random((300, 8, 8)) < 0.4)
+    compiled = trace.compiled_templates()
+    template_idx, _, scores = compiled.match(composites)
+    for composite, t, score in zip(composites, template_idx, scores):
+        assert (compiled.chars[t], score / 64.0) == reference_match(composite)
+
+def test_template_ties_go_to_earlier_orientation_and_template():
+    # Two identical templates and a symmetric pattern: every orientation and both templates tie.
+    pattern = np.zeros((8, 8), dtype=int)
+    pattern[3:5, 3:5] = 1
+    templates = {'a': pattern, 'b': pattern.copy()}
+    compiled = trace.CompiledTemplates(templates)
+    template_idx, orientation_idx, scores = compiled.match(pattern)
+    assert (template_idx[0], orientation_idx[0], scores[0]) == (0, 0, 64)
+    assert trace.get_best_character_match(pattern, templates) == ('a', 1.0, 64)
+
+
+# --- Automatic time-jump threshold ---
+def test_threshold_separates_two_gap_clusters():
+    frame_times = np.cumsum(np.tile([0.0005] * 20 + [0.1], 10))
+    threshold = trace.estimate_time_jump_threshold(frame_times)
+    assert 0.0005 < threshold < 0.1
+
+def test_threshold_is_none_for_uniform_gaps():
+    assert trace.estimate_time_jump_threshold(np.arange(100) * 0.001) is None
+
+
+# --- Batch reports ---
+def test_decode_capture_reports_errors_instead_of_raising(tmp_path):
+    broken = tmp_path / 'broken.csv'
+    broken.write_text('Time [s],GPIO 5\n0.0,1\n')
+    record = trace.decode_capture(str(broken))
+    assert record['error'] is not None and record['string'] == ''
+
+def test_decode_capture_record():
+    record = trace.decode_capture(CAPTURE)
+    assert record['error'] is None
+    assert record['string'] == EXPECTED_STRING and record['flags'] == []
+    assert len(record['confidences']) == len(record['start_samples']) == len(EXPECTED_STRING)
+
+def test_batch_worker_installs_parent_templates():
+    compiled = trace.compiled_templates()
+    previous = trace._COMPILED_TEMPLATES
+    try:
+        trace._init_batch_worker(compiled)
+        assert trace.compiled_templates() is compiled
+    finally:
+        trace._COMPILED_TEMPLATES = previous